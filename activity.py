@@ -2,6 +2,7 @@ import os
 import json
 from typing import List, Dict, Optional
 from datetime import datetime, timedelta
+from temporal import parse_time
 
 def child_activity_planner(
     activities: List[Dict[str, str | List[str] | str]],
@@ -23,6 +24,8 @@ def child_activity_planner(
     # Initialize calendar and reminders
     calendar = {day: [] for day in days_of_week}
     reminders = []
+    # Minutes since midnight of each calendar entry and reminder, for sorting
+    sort_minutes = {}
     
     # Get start of the current week (Monday)
     start_of_week = current_dt - timedelta(days=current_dt.weekday())
@@ -40,11 +43,14 @@ def child_activity_planner(
         repetition = activity["repetition"].lower()
         caregiver = activity["caregiver"]
         
-        # Validate time format (HH:MM)
-        try:
-            datetime.strptime(time, "%H:%M")
-        except ValueError:
-            raise ValueError(f"Invalid time format for activity '{name}', use HH:MM")
+        # Validate time format (HH:MM); activities loaded from the database carry
+        # the time parsed when they were saved
+        minutes = activity.get("time_minutes")
+        if minutes is None:
+            try:
+                minutes = parse_time(time)
+            except ValueError:
+                raise ValueError(f"Invalid time format for activity '{name}', use HH:MM")
         
         # Validate days
         for day in days:
@@ -64,6 +70,7 @@ def child_activity_planner(
                 "caregiver": caregiver,
                 "repetition": repetition
             }
+            sort_minutes[id(activity_details)] = minutes
             calendar[day].append(activity_details)
         
         # Generate reminders for the current week
@@ -86,6 +93,7 @@ def child_activity_planner(
                     "caregiver": caregiver,
                     "message": f"Reminder: {name} on {day}, {activity_date.strftime('%Y-%m-%d')} at {time} at {location} (Caregiver: {caregiver})"
                 }
+                sort_minutes[id(reminder)] = minutes
                 reminders.append(reminder)
         elif repetition == "monthly":
             # For monthly, include if the day of the month matches or is within the current week
@@ -101,14 +109,15 @@ def child_activity_planner(
                     "caregiver": caregiver,
                     "message": f"Reminder: {name} on {days[0]}, {activity_date.strftime('%Y-%m-%d')} at {time} at {location} (Caregiver: {caregiver})"
                 }
+                sort_minutes[id(reminder)] = minutes
                 reminders.append(reminder)
     
-    # Sort activities by time within each day
+    # Sort activities by time within each day (by minutes, so "9:00" comes before "14:00")
     for day in calendar:
-        calendar[day].sort(key=lambda x: x["time"])
+        calendar[day].sort(key=lambda x: sort_minutes[id(x)])
     
     # Sort reminders by date and time
-    reminders.sort(key=lambda x: (x["date"], x["time"]))
+    reminders.sort(key=lambda x: (x["date"], sort_minutes[id(x)]))
     
     # Return combined output
     return {
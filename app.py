@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 from datetime import datetime
@@ -129,6 +130,37 @@ if role in ["Parent", "Driver"]:
             else:
                 st.warning("No driver-required activities in the schedule")
 
+# Parent and Driver can follow live reminders and schedule changes
+if role in ["Parent", "Driver"]:
+    st.header("Live Reminders")
+    listen_seconds = st.slider("Listen for (seconds)", 10, 300, 60)
+    if st.button("Start Listening"):
+        placeholder = st.empty()
+        received = []
+        try:
+            # Server-Sent Events pushed by the backend, instead of re-querying /driver_schedule
+            with requests.get(f"{BASE_URL}/reminders/stream", params={"role": role}, stream=True,
+                              timeout=(5, listen_seconds)) as response:
+                response.raise_for_status()
+                deadline = datetime.now().timestamp() + listen_seconds
+                for line in response.iter_lines(decode_unicode=True):
+                    if datetime.now().timestamp() > deadline:
+                        break
+                    if not line or not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[len("data: "):])
+                    if event["type"] == "reminder":
+                        received.append(f"🔔 {event['reminder']['message']}")
+                    elif event["type"] == "schedule":
+                        received.append(f"📅 Schedule updated: {len(event['schedule'])} entries")
+                        for entry in event["schedule"]:
+                            received.append(f"- {entry['day']} {entry['date']}: {entry['activity']} at {entry['time']} ({entry['location']}, Caregiver: {entry['caregiver']})")
+                    placeholder.write("\n".join(received))
+        except requests.exceptions.Timeout:
+            pass
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error: {e}")
+
 # Cook can view meal plan
 if role == "Cook":
     st.header("Meal Plan")
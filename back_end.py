@@ -1,14 +1,41 @@
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
-from typing import List, Dict
-from meal_plane import weekly_meal_planner
-from shopping import shopping_list_generator
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse, StreamingResponse, Response
+from email.utils import parsedate_to_datetime
+from pydantic import BaseModel, field_validator
+from typing import List, Dict, Optional
+from meal_plane import weekly_meal_planner, regenerate_meals, merge_preferences
+from shopping import shopping_list_generator, update_shopping_list
 from db import (
     load_latest_data,save_family_member, save_activity, delete_activity,save_meal_plan, save_shopping_list, save_schedule,
+    count_table_rows, activities_state, iter_activities, unit_of_work, search_meal_history, load_meal_plan,
+    read_versions, read_change, load_schedule, EXPORT_TABLES, export_columns, iter_export_rows, latest_meal_plan_preferences,
 )
+from metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS, render_metrics
+import tracing
+from tracing import traced, traced_endpoint
+from resilience import request_budget
+from reminders import scheduler, format_sse, visible_to
+from cache import CACHE_POLL_SECONDS
+from temporal import (
+    format_date, format_time, normalize_days, normalize_repetition, parse_date, parse_time, parse_weekday,
+)
+from calendar_feed import ics_stream, feed_validators
+from export import ndjson_stream, csv_stream, parse_timestamp
 from enum import Enum
 
-app = FastAPI(title="Family Planner API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Precompute upcoming reminders and start pushing them to subscribers."""
+    scheduler.rebuild(load_latest_data()["activities"])
+    tasks = [asyncio.create_task(scheduler.run()), asyncio.create_task(follow_activity_changes())]
+    yield
+    for task in tasks:
+        task.cancel()
+
+app = FastAPI(title="Family Planner API", lifespan=lifespan)
 
 # Role Enum
 class Role(str, Enum):
@@ -16,6 +43,50 @@ class Role(str, Enum):
     COOK = "Cook"
     DRIVER = "Driver"
 
+# Request metrics
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record latency per route template and role for every request."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Label by route template, not raw path, to keep label cardinality bounded
+        route_path = route.path if route is not None else "unmatched"
+        role = request.query_params.get("role")
+        role = role if role in [r.value for r in Role] else "none"
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=request.method, route=route_path, role=role)
+        HTTP_REQUESTS.inc(method=request.method, route=route_path, role=role, status=str(status))
+
+# Latency budget for upstream LLM calls made while serving a request
+@app.middleware("http")
+async def apply_request_budget(request: Request, call_next):
+    with request_budget():
+        return await call_next(request)
+
+# Request tracing
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Trace sampled requests, or any request sending the debug header, and return Server-Timing."""
+    debug = request.headers.get(tracing.DEBUG_HEADER, "").lower() in ("1", "true", "yes")
+    if not tracing.should_trace(debug):
+        return await call_next(request)
+    trace, token = tracing.start_trace(f"{request.method} {request.url.path}", debug=debug)
+    try:
+        response = await call_next(request)
+        if trace.handler_end is not None:
+            trace.add_span("serialization", trace.handler_end, time.perf_counter())
+    finally:
+        tracing.end_trace(trace, token)
+    if debug:
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["X-Trace-Id"] = trace.trace_id
+    return response
+
 # Pydantic models
 class FamilyMemberRequest(BaseModel):
     name: str
@@ -30,19 +101,39 @@ class ActivityRequest(BaseModel):
     driver_required: bool = False  # New field for driver requirement
     date: str  # Assuming date is required as per the endpoint
 
-class ActivityUpdateRequest(BaseModel):
-    name: str
-    time: str
-    days: List[str]
-    location: str
-    caregiver: str
-    repetition: str
-    driver_required: bool = False
-    date: str
+    # Reject malformed values with a 422 and store canonical forms: "HH:MM",
+    # "YYYY-MM-DD", capitalized day names in week order, lowercase repetition
+    @field_validator("time")
+    @classmethod
+    def check_time(cls, value: str) -> str:
+        return format_time(parse_time(value))
+
+    @field_validator("date")
+    @classmethod
+    def check_date(cls, value: str) -> str:
+        return format_date(parse_date(value))
+
+    @field_validator("days")
+    @classmethod
+    def check_days(cls, value: List[str]) -> List[str]:
+        return normalize_days(value)
+
+    @field_validator("repetition")
+    @classmethod
+    def check_repetition(cls, value: str) -> str:
+        return normalize_repetition(value)
+
+class ActivityUpdateRequest(ActivityRequest):
+    pass
 
 class MealPlanRequest(BaseModel):
     preferences: str
 
+class MealRegenerateRequest(BaseModel):
+    day: str
+    meal: Optional[str] = None  # breakfast, lunch or dinner; the whole day when omitted
+    preferences: str = ""  # Added to the preferences the plan was generated from
+
 class StateResponse(BaseModel):
     family_members: List[str] = []
     activities: List[Dict] = []
@@ -76,24 +167,14 @@ def filter_data_by_role(data: Dict, role: Role) -> Dict:
     return filtered_data
 
 # Helper functions
-def generate_schedule(activities: List[Dict], role: Role = Role.PARENT) -> List[Dict]:
-    """Generate a reminder schedule from activities, filtered by role."""
-    schedule = []
-    for activity in activities:
-        if role == Role.DRIVER and not activity.get("driver_required", False):
-            continue
-        days = activity.get("days", [])
-        for day in days:
-            schedule.append({
-                "day": day,
-                "activity": activity["name"],
-                "time": activity["time"],
-                "location": activity["location"],
-                "caregiver": activity["caregiver"],
-                "driver_required": activity.get("driver_required", False),
-                "date": activity.get("date")
-            })
-    return sorted(schedule, key=lambda x: (x["day"], x["time"]))
+@traced("generate_schedule")
+def generate_schedule(role: Role = Role.PARENT, driver_only: bool = False, **filters) -> List[Dict]:
+    """Generate a reminder schedule from the stored activities, filtered by role.
+
+    Entries come in week order (Monday first), then by time of day; ordering and
+    filters run in SQL on the parsed weekday/time columns.
+    """
+    return load_schedule(driver_only=driver_only or role == Role.DRIVER, **filters)
 
 def create_meal_plan_table(meal_plan: Dict) -> List[Dict]:
     days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
@@ -129,6 +210,7 @@ def get_meal_plan_details(meal_plan: Dict) -> Dict:
     return details
 
 @app.post("/family_member")
+@traced_endpoint
 async def add_family_member(member: FamilyMemberRequest, role: Role = Query(..., description="User role")):
     """Add a new family member (Parent only)."""
     if role != Role.PARENT:
@@ -137,6 +219,7 @@ async def add_family_member(member: FamilyMemberRequest, role: Role = Query(...,
     return {"message": f"Added {member.name} to family members", "name": member.name}
 
 @app.post("/Child_activity")
+@traced_endpoint
 async def add_activity(activity: ActivityRequest, role: Role = Query(..., description="User role")):
     """Add a new activity (Parent only)."""
     if role != Role.PARENT:
@@ -151,16 +234,20 @@ async def add_activity(activity: ActivityRequest, role: Role = Query(..., descri
         "driver_required": activity.driver_required,
         "date": activity.date
     }
-    save_activity(new_activity)
-    # Reload latest data to include the newly added activity
-    data = load_latest_data()
-    activities = data["activities"]
-    # Generate schedule for all roles to ensure driver sees the activity
-    schedule = generate_schedule(activities, Role.PARENT)  # Use PARENT role to include all activities
-    save_schedule(schedule)
+    # Activity and schedule are written in one transaction
+    with unit_of_work():
+        save_activity(new_activity)
+        # Generate schedule for all roles to ensure driver sees the activity; the
+        # query sees the uncommitted activity
+        schedule = generate_schedule(Role.PARENT)  # Use PARENT role to include all activities
+        save_schedule(schedule)
+    # Queue the new activity's reminders and push the schedule to subscribed clients
+    scheduler.add_activity(new_activity)
+    scheduler.publish_schedule(schedule)
     return {"message": "Activity added", "activity": new_activity}
 
 @app.delete("/activity/{activity_name}")
+@traced_endpoint
 async def delete_activity_endpoint(activity_name: str, role: Role = Query(..., description="User role")):
     """Delete an activity by name (Parent only)."""
     if role != Role.PARENT:
@@ -168,30 +255,110 @@ async def delete_activity_endpoint(activity_name: str, role: Role = Query(..., d
     activities = load_latest_data()["activities"]
     if not any(activity["name"] == activity_name for activity in activities):
         raise HTTPException(status_code=404, detail="Activity not found")
-    delete_activity(activity_name)
     # Update schedule after deletion
-    remaining_activities = [a for a in activities if a["name"] != activity_name]
-    schedule = generate_schedule(remaining_activities, role)
-    save_schedule(schedule)
+    with unit_of_work():
+        delete_activity(activity_name)
+        schedule = generate_schedule(role)
+        save_schedule(schedule)
+    scheduler.remove_activity(activity_name)
+    scheduler.publish_schedule(schedule)
     return {"message": f"Activity '{activity_name}' deleted"}
 
 @app.post("/meal_plan")
-async def generate_meal_plan(meal_plan: MealPlanRequest, role: Role = Query(..., description="User role")):
-    """Generate a meal plan (Parent only)."""
+@traced_endpoint
+def generate_meal_plan(meal_plan: MealPlanRequest, role: Role = Query(..., description="User role")):
+    """Generate a meal plan (Parent only).
+
+    A plain def so FastAPI runs it in the threadpool: the LLM calls block while they wait.
+    """
     if role != Role.PARENT:
         raise HTTPException(status_code=403, detail="Only Parent role can generate meal plans")
     tool_calls = weekly_meal_planner(meal_plan.preferences)
     meal_plan_data = tool_calls[0]["args"]
     shopping_list = shopping_list_generator(meal_plan_data)
-    save_meal_plan(meal_plan_data)
-    save_shopping_list(shopping_list)
+    with unit_of_work():
+        plan_row = save_meal_plan(meal_plan_data, meal_plan.preferences)
+        save_shopping_list(shopping_list, plan_row)
     return {
         "message": "Meal plan generated",
         "meal_plan": meal_plan_data,
         "shopping_list": shopping_list
     }
 
+@app.post("/meal_plan/regenerate")
+@traced_endpoint
+def regenerate_meal_plan(request: MealRegenerateRequest, role: Role = Query(..., description="User role")):
+    """Regenerate one meal or one day of the latest meal plan (Parent only); runs in the threadpool."""
+    if role != Role.PARENT:
+        raise HTTPException(status_code=403, detail="Only Parent role can generate meal plans")
+    day = request.day.lower()
+    meal = request.meal.lower() if request.meal else None
+    if day not in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]:
+        raise HTTPException(status_code=400, detail=f"Invalid day '{request.day}'")
+    if meal is not None and meal not in ["breakfast", "lunch", "dinner"]:
+        raise HTTPException(status_code=400, detail=f"Invalid meal '{request.meal}', use breakfast/lunch/dinner")
+    data = load_latest_data()
+    if not data["meal_plan"]:
+        raise HTTPException(status_code=404, detail="No meal plan found")
+    # Keep the diet and cuisine the plan was generated for; the request can only add to them
+    preferences = merge_preferences(latest_meal_plan_preferences(), request.preferences)
+    meal_plan_data = regenerate_meals(data["meal_plan"], day, meal, preferences)
+    # Only the ingredients of the swapped meals are added or removed
+    shopping_list, changes = update_shopping_list(data["shopping_list"], data["meal_plan"], meal_plan_data)
+    with unit_of_work():
+        # Stored with the source plan's preferences, so week search still finds it by diet
+        plan_row = save_meal_plan(meal_plan_data, preferences)
+        save_shopping_list(shopping_list, plan_row)
+    return {
+        "message": "Meal plan updated",
+        "meal_plan": meal_plan_data,
+        "shopping_list": shopping_list,
+        "shopping_list_changes": changes
+    }
+
+@app.get("/meal_plan/search")
+@traced_endpoint
+async def search_meal_plans(q: str = Query(..., min_length=1, description="Dish, ingredient or preference words"),
+                            role: Role = Query(..., description="User role"),
+                            limit: int = Query(10, ge=1, le=100)):
+    """Search past meal plans for dishes and weeks, best match first (Parent, Cook)."""
+    if role not in [Role.PARENT, Role.COOK]:
+        raise HTTPException(status_code=403, detail="Access denied for this role")
+    try:
+        results = search_meal_history(q, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return {"query": q, **results}
+
+@app.post("/meal_plan/{plan_id}/reinstate")
+@traced_endpoint
+async def reinstate_meal_plan(plan_id: int, role: Role = Query(..., description="User role")):
+    """Make a past meal plan the current one without generating a new plan (Parent only)."""
+    if role != Role.PARENT:
+        raise HTTPException(status_code=403, detail="Only Parent role can generate meal plans")
+    past = load_meal_plan(plan_id)
+    if past is None:
+        raise HTTPException(status_code=404, detail=f"Meal plan {plan_id} not found")
+    shopping_list = past["shopping_list"]
+    if shopping_list is None:
+        # Plans saved before shopping lists were linked: derive the list from the
+        # current one, so only ingredients new to it are categorized
+        current = load_latest_data()
+        if current["shopping_list"]:
+            shopping_list, _ = update_shopping_list(current["shopping_list"], current["meal_plan"], past["meal_plan"])
+        else:
+            shopping_list = shopping_list_generator(past["meal_plan"])
+    with unit_of_work():
+        plan_row = save_meal_plan(past["meal_plan"], past["preferences"])
+        save_shopping_list(shopping_list, plan_row)
+    return {
+        "message": f"Meal plan {plan_id} reinstated",
+        "meal_plan": past["meal_plan"],
+        "shopping_list": shopping_list
+    }
+
 @app.get("/shopping_list_items")
+@traced_endpoint
 async def get_shopping_list_items(role: Role = Query(..., description="User role")):
     """Get shopping list as a flat list of items (Parent, Cook)."""
     if role not in [Role.PARENT, Role.COOK]:
@@ -203,17 +370,172 @@ async def get_shopping_list_items(role: Role = Query(..., description="User role
     return {"shopping_list_items": items}
 
 @app.get("/driver_schedule")
-async def get_driver_schedule(role: Role = Query(..., description="User role")):
-    """Get schedule for driver activities (Driver, Parent)."""
+@traced_endpoint
+async def get_driver_schedule(role: Role = Query(..., description="User role"),
+                              day: Optional[str] = Query(None, description="Only this day, e.g. Monday"),
+                              start: Optional[str] = Query(None, description="Earliest time, HH:MM"),
+                              end: Optional[str] = Query(None, description="Latest time, HH:MM"),
+                              from_date: Optional[str] = Query(None, description="Earliest activity date, YYYY-MM-DD"),
+                              to_date: Optional[str] = Query(None, description="Latest activity date, YYYY-MM-DD")):
+    """Get schedule for driver activities (Driver, Parent), optionally filtered by day, time and date."""
     if role not in [Role.DRIVER, Role.PARENT]:
         raise HTTPException(status_code=403, detail="Access denied for this role")
-    data = load_latest_data()
-    driver_activities = [a for a in data["activities"] if a.get("driver_required", False)]
-    if not driver_activities:
+    try:
+        filters = {
+            "weekday": parse_weekday(day) if day else None,
+            "start_minutes": parse_time(start) if start else None,
+            "end_minutes": parse_time(end) if end else None,
+            "from_date": parse_date(from_date) if from_date else None,
+            "to_date": parse_date(to_date) if to_date else None,
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    schedule = generate_schedule(role, driver_only=True, **filters)
+    if not schedule:
         return {"message": "No driver-required activities found", "schedule": []}
-    schedule = generate_schedule(driver_activities, role)
     return {"message": "Driver schedule retrieved", "schedule": schedule}
 
+async def follow_activity_changes():
+    """Rebuild reminders and push the schedule when activities change in another worker process."""
+    seen = read_versions().get("activities")
+    while True:
+        await asyncio.sleep(CACHE_POLL_SECONDS)
+        version = read_versions().get("activities")
+        if version is None or version == seen:
+            continue
+        seen = version
+        # Also fires after this worker's own writes; rebuilding is idempotent and
+        # already-delivered reminders are not resent
+        scheduler.rebuild(load_latest_data()["activities"])
+        scheduler.publish_schedule(generate_schedule(Role.PARENT))
+
+def _initial_schedule_event(role: Role) -> Dict:
+    """Current schedule for a newly connected subscriber, so clients never need to poll."""
+    schedule = generate_schedule(Role.PARENT)
+    return {"type": "schedule", "schedule": [entry for entry in schedule if visible_to(role.value, entry)]}
+
+@app.get("/reminders/stream")
+async def stream_reminders(request: Request, role: Role = Query(..., description="User role")):
+    """Push due reminders and schedule changes as Server-Sent Events (Driver, Parent)."""
+    if role not in [Role.DRIVER, Role.PARENT]:
+        raise HTTPException(status_code=403, detail="Access denied for this role")
+    queue = scheduler.subscribe(role.value)
+    initial = _initial_schedule_event(role)
+
+    async def events():
+        try:
+            yield format_sse(initial)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            scheduler.unsubscribe(role.value, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/ws/reminders")
+async def reminders_websocket(websocket: WebSocket, role: Role = Query(..., description="User role")):
+    """Push due reminders and schedule changes over a WebSocket (Driver, Parent)."""
+    if role not in [Role.DRIVER, Role.PARENT]:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    queue = scheduler.subscribe(role.value)
+    # Wait on the client as well as the queue, so a disconnect is noticed (and the
+    # subscription dropped) even while no event is due
+    receive = asyncio.ensure_future(websocket.receive())
+    get = None
+    try:
+        await websocket.send_json(_initial_schedule_event(role))
+        while True:
+            if get is None:
+                get = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({receive, get}, return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                await websocket.send_json(get.result())
+                get = None
+            if receive in done:
+                if receive.result()["type"] == "websocket.disconnect":
+                    break
+                # Messages from the client are ignored
+                receive = asyncio.ensure_future(websocket.receive())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (receive, get):
+            if task is not None:
+                task.cancel()
+        scheduler.unsubscribe(role.value, queue)
+
+@app.get("/calendar.ics")
+async def get_calendar_feed(request: Request, role: Role = Query(..., description="User role")):
+    """iCalendar feed of activities (Driver, Parent); returns 304 when the feed is unchanged."""
+    if role not in [Role.DRIVER, Role.PARENT]:
+        raise HTTPException(status_code=403, detail="Access denied for this role")
+    driver_only = role == Role.DRIVER
+    # The activities' change marker, bumped by deletes too, decides whether the client's copy is current
+    change = read_change("activities")
+    if change is not None:
+        validators = feed_validators(role.value, *change)
+    else:
+        # Without a marker deletes leave no timestamp, so only an ETag over the table state is offered
+        validators = feed_validators(role.value, activities_state(driver_only))
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if validators["ETag"] in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=validators)
+    elif "Last-Modified" in validators and request.headers.get("if-modified-since"):
+        try:
+            if parsedate_to_datetime(validators["Last-Modified"]) <= parsedate_to_datetime(request.headers["if-modified-since"]):
+                return Response(status_code=304, headers=validators)
+        except (TypeError, ValueError):
+            pass
+    feed = ics_stream(iter_activities(driver_only), f"Family Planner ({role.value})")
+    return StreamingResponse(feed, media_type="text/calendar; charset=utf-8", headers=validators)
+
+@app.get("/export")
+async def export_data(role: Role = Query(..., description="User role"),
+                      tables: Optional[str] = Query(None, description="Comma separated tables; all when omitted"),
+                      export_format: str = Query("ndjson", alias="format", description="ndjson or csv (csv needs exactly one table)"),
+                      since: Optional[str] = Query(None, description="Only rows saved at or after this ISO 8601 time"),
+                      until: Optional[str] = Query(None, description="Only rows saved at or before this ISO 8601 time")):
+    """Stream a bulk export of the database (Parent only), reading rows in fixed-size batches."""
+    if role != Role.PARENT:
+        raise HTTPException(status_code=403, detail="Only Parent role can export data")
+    names = [name.strip() for name in tables.split(",") if name.strip()] if tables else list(EXPORT_TABLES)
+    unknown = [name for name in names if name not in EXPORT_TABLES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables {unknown}, use {list(EXPORT_TABLES)}")
+    if export_format not in ["ndjson", "csv"]:
+        raise HTTPException(status_code=400, detail="Invalid format, use ndjson or csv")
+    if export_format == "csv" and len(names) != 1:
+        raise HTTPException(status_code=400, detail="CSV export needs exactly one table")
+    try:
+        since_ts, until_ts = parse_timestamp(since), parse_timestamp(until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if export_format == "csv":
+        body = csv_stream(export_columns(names[0]), iter_export_rows(names[0], since_ts, until_ts, decode_json=False))
+        media_type, extension = "text/csv; charset=utf-8", "csv"
+    else:
+        # Generator of (table, rows), so each table's cursor opens only when the previous one is done
+        body = ndjson_stream((name, iter_export_rows(name, since_ts, until_ts)) for name in names)
+        media_type, extension = "application/x-ndjson", "ndjson"
+    filename = f"family_planner_{'_'.join(names) if len(names) == 1 else 'export'}.{extension}"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose request, database and LLM metrics in the Prometheus text format."""
+    return PlainTextResponse(render_metrics(count_table_rows()), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+# Each benchmark runs in a fresh process against a temporary database, so it never
+# touches family_planner.db or the settings of an importing process
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+WRITE_MODES = ["per-helper commits", "unit of work", "unit of work + write-behind"]
+
+
+def _writes(db_url, mode, requests, workers, window_ms, results):
+    """Worker process: serve the writes of POST /meal_plan in one commit mode."""
+    os.environ["FAMILY_PLANNER_DB_URL"] = db_url
+    os.environ["DB_WRITE_BEHIND_MS"] = str(window_ms if "write-behind" in mode else 0)
+    from sqlalchemy import event
+    import db
+    meal_plan = {day: [["Dish", "onion, tomato, garlic, rice"]] * 3 for day in DAYS}
+    shopping_list = {"Produce": ["onion", "tomato", "garlic"], "Pantry": ["rice"]}
+    commits = []
+    event.listen(db.engine, "commit", lambda conn: commits.append(1))
+
+    def handle_request(i):
+        if mode == "per-helper commits":
+            db.save_meal_plan(meal_plan)
+            db.save_shopping_list(shopping_list)
+        else:
+            with db.unit_of_work():
+                db.save_meal_plan(meal_plan)
+                db.save_shopping_list(shopping_list)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(handle_request, range(requests)))
+    db._wait_for_pending_writes()
+    results.put((time.perf_counter() - start, len(commits)))
+
+
+def benchmark_writes(requests=500, workers=8, window_ms=10):
+    """Compare commit count and throughput of per-helper commits, unit of work and write-behind."""
+    for mode in WRITE_MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_writes, args=(f"sqlite:///{tmp}/bench.db", mode, requests, workers, window_ms, results))
+            process.start()
+            elapsed, commits = results.get()
+            process.join()
+            print(f"{mode:<28} {requests / elapsed:8.0f} req/s  {commits:5} commits for {requests} requests")
+
+
+def _search(db_url, meals, runs):
+    """Worker process: store the given number of meals, then time meal history searches."""
+    os.environ["FAMILY_PLANNER_DB_URL"] = db_url
+    import db
+    from meal_engine import MEAL_TYPES, load_catalog
+    catalog = load_catalog()
+    styles = ["", "Spicy ", "Quick ", "Classic ", "Smoky ", "Creamy ", "Herby ", "Crispy ", "Grandma's ", "Weeknight "]
+    preferences = ["vegetarian italian", "indian non vegetarian spicy", "quick mexican", "vegan", "gluten-free", ""]
+    queries = ["spinach lasagna", "chicken", "vegetarian", "eggs", "tofu curry", "grandma chickpea", "dragonfruit soup"]
+    random.seed(7)
+
+    start = time.perf_counter()
+    plans = meals // (len(DAYS) * len(MEAL_TYPES))
+    for batch_start in range(0, plans, 500):
+        with db.unit_of_work():
+            for _ in range(min(500, plans - batch_start)):
+                db.save_meal_plan({
+                    day: [[random.choice(styles) + recipe["name"], ", ".join(recipe["ingredients"])]
+                          for recipe in random.sample(catalog, len(MEAL_TYPES))]
+                    for day in DAYS
+                }, random.choice(preferences))
+    print(f"Stored and indexed {plans * len(DAYS) * len(MEAL_TYPES)} meals ({plans} plans) "
+          f"in {time.perf_counter() - start:.1f} s")
+
+    print(f"{'query':<20} {'dishes':>6} {'weeks':>6} {'p50 ms':>8} {'p99 ms':>8}")
+    for query in queries:
+        latencies = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            results = db.search_meal_history(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        print(f"{query:<20} {len(results['dishes']):>6} {len(results['weeks']):>6} "
+              f"{latencies[len(latencies) // 2]:8.2f} {latencies[int(len(latencies) * 0.99)]:8.2f}")
+
+    # What answering "have we made spinach lasagna?" cost before: decode every plan
+    start = time.perf_counter()
+    with db.session_scope() as session:
+        found = sum(
+            1 for (data,) in session.query(db.MealPlan.data)
+            for day_meals in json.loads(data).values() for meal in day_meals
+            if "spinach" in meal[0].lower() and "lasagna" in meal[0].lower()
+        )
+    print(f"Scanning every stored plan instead: {(time.perf_counter() - start) * 1000:.1f} ms ({found} matches)")
+
+
+def benchmark_search(meals=100_000, runs=50):
+    """Time meal history searches over a database holding the given number of stored meals."""
+    with tempfile.TemporaryDirectory() as tmp:
+        process = multiprocessing.Process(target=_search, args=(f"sqlite:///{tmp}/bench.db", meals, runs))
+        process.start()
+        process.join()
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("spawn")
+    if sys.argv[1:] == ["search"]:
+        benchmark_search()
+    else:
+        benchmark_writes()
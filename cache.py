@@ -0,0 +1,159 @@
+import os
+import time
+import threading
+import tempfile
+import multiprocessing
+from typing import Callable, Dict, Optional
+
+from metrics import REGISTRY, Counter
+
+# How often each worker checks for changes made by other workers to state it pushes
+# to subscribers (reminders); request reads check on every call
+CACHE_POLL_SECONDS = float(os.getenv("CACHE_POLL_SECONDS", "2"))
+
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "family_cache_lookups_total", "In-process cache lookups by resource and result",
+    ("resource", "result")
+))
+
+
+class VersionedCache:
+    """In-process cache of values loaded from database tables.
+
+    Each value is stored with the version of the table it was loaded from. Versions
+    live in the database (the cache_versions table, bumped by triggers on every
+    write), so a write committed by any worker process makes the other workers
+    reload that one resource on their next lookup; unchanged resources stay cached.
+    Cached values are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, resource: str, version: Optional[int], loader: Callable):
+        """Cached value if it was loaded at this version, otherwise loader()'s result.
+
+        A version of None (no version available) always loads and does not cache.
+        """
+        if version is None:
+            CACHE_LOOKUPS.inc(resource=resource, result="bypass")
+            return loader()
+        with self._lock:
+            entry = self._entries.get(resource)
+        if entry is not None and entry[0] == version:
+            CACHE_LOOKUPS.inc(resource=resource, result="hit")
+            return entry[1]
+        CACHE_LOOKUPS.inc(resource=resource, result="miss")
+        # The version was read before loading, so a write racing with the load can
+        # only make the stored value newer than its version, never staler
+        value = loader()
+        with self._lock:
+            self._entries[resource] = (version, value)
+        return value
+
+    def invalidate(self, resource: Optional[str] = None):
+        with self._lock:
+            if resource is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(resource, None)
+
+
+def _reader(db_url, duration, use_cache, seen_at, requests_done, start_event):
+    """Worker process: serve load_latest_data() 'requests' and note when each activity is first seen."""
+    os.environ["FAMILY_PLANNER_DB_URL"] = db_url
+    import db
+    if not use_cache:
+        db.read_versions = lambda: {}
+    start_event.wait()
+    count = 0
+    seen = set()
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        activities = db.load_latest_data()["activities"]
+        now = time.time()
+        if len(activities) != len(seen):
+            for activity in activities:
+                if activity["name"] not in seen:
+                    seen.add(activity["name"])
+                    seen_at[activity["name"]] = now
+        count += 1
+    requests_done.put(count)
+
+
+def _writer(db_url, duration, interval, written_at, start_event):
+    """Worker process: add an activity every interval seconds and record its commit time."""
+    os.environ["FAMILY_PLANNER_DB_URL"] = db_url
+    import db
+    start_event.wait()
+    deadline = time.time() + duration
+    i = 0
+    while time.time() < deadline:
+        name = f"Activity {i}"
+        db.save_activity({"name": name, "time": "15:00", "days": ["Monday"], "location": "Field",
+                          "caregiver": "Alice", "repetition": "weekly", "driver_required": True,
+                          "date": "2025-06-09"})
+        written_at[name] = time.time()
+        i += 1
+        time.sleep(interval)
+
+
+def main():
+    # Readers in separate processes share one SQLite file while a writer process adds
+    # activities: report read throughput per worker count, with and without the cache,
+    # and how long after each commit every reader first saw the new activity
+    duration, write_interval = 3.0, 0.05
+    print(f"{os.cpu_count()} CPU(s) available")
+    print(f"{'workers':>7} {'cache':>6} {'req/s':>9} {'max staleness ms':>17} {'missed':>7}")
+    for workers in (1, 2, 4):
+        for use_cache in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                db_url = f"sqlite:///{tmp}/bench.db"
+                # Create the schema and start with 200 activities to read
+                seed = multiprocessing.Process(target=_seed, args=(db_url, 200))
+                seed.start()
+                seed.join()
+
+                manager = multiprocessing.Manager()
+                seen = [manager.dict() for _ in range(workers)]
+                written_at = manager.dict()
+                done = multiprocessing.Queue()
+                start_event = multiprocessing.Event()
+                processes = [
+                    multiprocessing.Process(target=_reader, args=(db_url, duration, use_cache, seen[i], done, start_event))
+                    for i in range(workers)
+                ] + [multiprocessing.Process(target=_writer, args=(db_url, duration - 0.5, write_interval, written_at, start_event))]
+                for process in processes:
+                    process.start()
+                time.sleep(1.0)  # Let every process import and connect
+                start_event.set()
+                for process in processes:
+                    process.join()
+                total = sum(done.get() for _ in range(workers))
+
+                staleness, missed = 0.0, 0
+                for name, committed in written_at.items():
+                    for worker_seen in seen:
+                        if name in worker_seen:
+                            staleness = max(staleness, worker_seen[name] - committed)
+                        else:
+                            missed += 1
+                print(f"{workers:>7} {'on' if use_cache else 'off':>6} {total / duration:9.0f} "
+                      f"{staleness * 1000:17.1f} {missed:>7}")
+                manager.shutdown()
+
+
+def _seed(db_url, count):
+    os.environ["FAMILY_PLANNER_DB_URL"] = db_url
+    import db
+    with db.unit_of_work():
+        for i in range(count):
+            db.save_activity({"name": f"Seed {i}", "time": "09:00", "days": ["Tuesday"], "location": "School",
+                              "caregiver": "Bob", "repetition": "weekly", "driver_required": False,
+                              "date": "2025-06-10"})
+
+
+if __name__ == "__main__":
+    multiprocessing.set_start_method("spawn")
+    main()
@@ -0,0 +1,159 @@
+import time
+import hashlib
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Dict, Iterable, Iterator, Optional
+
+from temporal import weekday_numbers
+
+ICAL_DAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+# Activities have no end time, so calendar entries get a fixed length
+EVENT_DURATION = "PT1H"
+
+
+def escape_text(value: str) -> str:
+    """Escape a TEXT property value (RFC 5545 section 3.3.11)."""
+    return (str(value).replace("\\", "\\\\").replace(";", "\\;")
+            .replace(",", "\\,").replace("\n", "\\n"))
+
+
+def fold(line: str) -> str:
+    """Fold a content line at 75 octets and terminate it with CRLF."""
+    if len(line) <= 75 and line.isascii():
+        return line + "\r\n"
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Do not split a multi-byte UTF-8 sequence
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _first_occurrence(start: datetime, weekdays) -> datetime:
+    """First date on or after start that falls on one of the weekdays."""
+    for offset in range(7):
+        candidate = start + timedelta(days=offset)
+        if candidate.weekday() in weekdays:
+            return candidate
+    return start
+
+
+def vevent_lines(activity: Dict, stamp: str) -> Iterator[str]:
+    """Content lines of one VEVENT; activities whose time or date cannot be parsed are skipped."""
+    try:
+        # Use the time and date parsed when the activity was saved; split by hand
+        # otherwise, as strptime dominates generation time for large feeds
+        minutes = activity.get("time_minutes")
+        if minutes is None:
+            hour, minute = (int(part) for part in activity["time"].split(":"))
+        else:
+            hour, minute = divmod(minutes, 60)
+        if activity.get("date_ordinal") is not None:
+            start = datetime.fromordinal(activity["date_ordinal"]).replace(hour=hour, minute=minute)
+        else:
+            year, month, day = (int(part) for part in activity["date"].split("-"))
+            start = datetime(year, month, day, hour, minute)
+    except (KeyError, AttributeError, ValueError):
+        return
+    repetition = (activity.get("repetition") or "").lower()
+    weekdays = sorted(weekday_numbers(activity.get("days", [])))
+
+    rrule = None
+    if repetition == "weekly" and weekdays:
+        start = _first_occurrence(start, weekdays)
+        rrule = "FREQ=WEEKLY;BYDAY=" + ",".join(ICAL_DAYS[d] for d in weekdays)
+    elif repetition == "monthly":
+        rrule = f"FREQ=MONTHLY;BYMONTHDAY={start.day}"
+
+    description = f"Caregiver: {activity['caregiver']}"
+    if activity.get("driver_required"):
+        description += "\nDriver required"
+
+    yield "BEGIN:VEVENT"
+    yield f"UID:activity-{activity['id']}@family-planner"
+    yield f"DTSTAMP:{stamp}"
+    # Floating local time, as activities are entered in the family's own time zone
+    yield f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}"
+    yield f"DURATION:{EVENT_DURATION}"
+    if rrule:
+        yield f"RRULE:{rrule}"
+    yield f"SUMMARY:{escape_text(activity['name'])}"
+    yield f"LOCATION:{escape_text(activity['location'])}"
+    yield f"DESCRIPTION:{escape_text(description)}"
+    yield "END:VEVENT"
+
+
+def ics_stream(activities: Iterable[Dict], calendar_name: str, batch_lines: int = 200) -> Iterator[str]:
+    """Yield an iCalendar document in chunks of about batch_lines lines, consuming activities lazily."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    buffer = [
+        fold("BEGIN:VCALENDAR"),
+        fold("VERSION:2.0"),
+        fold("PRODID:-//Family Planner//Activities//EN"),
+        fold("CALSCALE:GREGORIAN"),
+        fold(f"X-WR-CALNAME:{escape_text(calendar_name)}"),
+    ]
+    for activity in activities:
+        buffer.extend(fold(line) for line in vevent_lines(activity, stamp))
+        if len(buffer) >= batch_lines:
+            yield "".join(buffer)
+            buffer = []
+    buffer.append(fold("END:VCALENDAR"))
+    yield "".join(buffer)
+
+
+def feed_validators(role: str, marker, last_modified: Optional[datetime] = None,
+                    now: Optional[datetime] = None) -> Dict[str, str]:
+    """ETag and Last-Modified for a role's feed.
+
+    marker and last_modified must change on every write to the activities, deletes
+    included. HTTP dates have one-second resolution, so Last-Modified is only sent
+    once the second of the last change is over: a change later in that same second
+    would otherwise keep the date, and If-Modified-Since would return 304 for it.
+    """
+    etag = hashlib.sha1(f"{role}:{marker}".encode()).hexdigest()
+    validators = {"ETag": f'"{etag}"'}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            # SQLite drops the zone; timestamps are written in UTC
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        last_modified = last_modified.replace(microsecond=0)
+        if (now or datetime.now(timezone.utc)) >= last_modified + timedelta(seconds=1):
+            validators["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return validators
+
+
+def main():
+    activities = [{
+        "id": i,
+        "name": f"Activity {i}",
+        "time": f"{8 + i % 10:02d}:{(i * 7) % 60:02d}",
+        "days": ["Monday", "Wednesday"] if i % 3 else ["Saturday"],
+        "location": "Community Field, Gate 2",
+        "caregiver": "Alice",
+        "repetition": ["weekly", "monthly", "one-time"][i % 3],
+        "driver_required": i % 2 == 0,
+        "date": "2025-06-09",
+    } for i in range(10_000)]
+
+    start = time.perf_counter()
+    first_chunk = None
+    size = 0
+    for chunk in ics_stream(activities, "Family Planner"):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    print(f"10k activities: first chunk after {first_chunk * 1000:.2f} ms, "
+          f"full feed {total * 1000:.1f} ms, {size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,58 @@
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey, DDL, Index, func, inspect, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import event
+import os
+import sys
+import re
 import json
+import time
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import Future
 from datetime import datetime, timezone
+from metrics import instrument_engine
+from cache import VersionedCache
+from temporal import DAYS_OF_WEEK, format_time, parse_date, parse_time, parse_weekday
+import tracing
 
 # Initialize SQLAlchemy
 Base = declarative_base()
-engine = create_engine('sqlite:///family_planner.db', echo=False)
+DATABASE_URL = os.getenv("FAMILY_PLANNER_DB_URL", "sqlite:///family_planner.db")
+# Group snapshot writes (meal plans, shopping lists, schedules) arriving within this
+# many milliseconds into one commit; 0 commits every write synchronously
+WRITE_BEHIND_MS = int(os.getenv("DB_WRITE_BEHIND_MS", "0"))
+# Commit attempts before a write-behind batch is dropped, and the longest wait between them
+WRITE_BEHIND_RETRIES = int(os.getenv("DB_WRITE_BEHIND_RETRIES", "5"))
+WRITE_BEHIND_MAX_BACKOFF = 5.0
+
+# How long a connection waits for another worker's write lock, and how long a
+# worker waits at startup for another one to finish migrating the schema
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SCHEMA_LOCK_TIMEOUT_MS = 120_000
+
+logger = logging.getLogger(__name__)
+engine = create_engine(DATABASE_URL, echo=False)
 Session = sessionmaker(bind=engine)
+instrument_engine(engine)
+tracing.instrument_engine(engine)
+tracing.instrument_sessions(Session)
+
+@event.listens_for(engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets several worker processes read while one writes; wait for locks instead of failing."""
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return
+    cursor = dbapi_connection.cursor()
+    # Set the timeout first: switching to WAL needs a lock another worker may hold
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
 
 # Define database models
 class FamilyMember(Base):
@@ -28,19 +72,36 @@ class Activity(Base):
     repetition = Column(String, nullable=False)
     driver_required = Column(Boolean, default=False)  # Add driver_required field
     date = Column(String, nullable=False)  # Add date field
+    # Parsed once on save so ordering and range filters run in SQL
+    time_minutes = Column(Integer, nullable=True)  # Minutes since midnight
+    date_ordinal = Column(Integer, nullable=True)  # date.toordinal()
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    weekdays = relationship("ActivityDay", cascade="all, delete-orphan")
+    __table_args__ = (Index("ix_activities_date_time", "date_ordinal", "time_minutes"),)
+
+class ActivityDay(Base):
+    """One row per day an activity takes place, for day/time ordering and filters in SQL."""
+    __tablename__ = 'activity_days'
+    id = Column(Integer, primary_key=True)
+    activity_id = Column(Integer, ForeignKey('activities.id'), nullable=False, index=True)
+    weekday = Column(Integer, nullable=False)  # Monday = 0
+    time_minutes = Column(Integer, nullable=True)  # Copy of the activity's, to order within a day by index
+    __table_args__ = (Index("ix_activity_days_weekday_time", "weekday", "time_minutes"),)
 
 class MealPlan(Base):
     __tablename__ = 'meal_plans'
     id = Column(Integer, primary_key=True)
     data = Column(Text, nullable=False)  # Store as JSON string
+    preferences = Column(Text, nullable=True)  # Query the plan was generated from
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
 class ShoppingList(Base):
     __tablename__ = 'shopping_lists'
     id = Column(Integer, primary_key=True)
     data = Column(Text, nullable=False)  # Store as JSON string
+    meal_plan_id = Column(Integer, ForeignKey('meal_plans.id'), nullable=True)  # Plan the list was built for
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    meal_plan = relationship(MealPlan)
 
 class Schedule(Base):
     __tablename__ = 'schedules'
@@ -48,56 +109,493 @@ class Schedule(Base):
     data = Column(Text, nullable=False)  # Store as JSON string
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
-# Create tables
-Base.metadata.create_all(engine)
+class MealDish(Base):
+    __tablename__ = 'meal_dishes'
+    id = Column(Integer, primary_key=True)
+    key = Column(String, nullable=False, unique=True)  # Lowercased dish name
+    name = Column(String, nullable=False)
+    ingredients = Column(Text, nullable=False)  # As first planned
 
-def load_latest_data():
-    """Load the latest data from the database."""
+class MealOccurrence(Base):
+    __tablename__ = 'meal_occurrences'
+    id = Column(Integer, primary_key=True)
+    dish_id = Column(Integer, ForeignKey('meal_dishes.id'), nullable=False, index=True)
+    meal_plan_id = Column(Integer, ForeignKey('meal_plans.id'), nullable=False, index=True)
+    day = Column(String, nullable=False)
+    meal = Column(String, nullable=False)
+
+# Full-text indexes (SQLite FTS5) over meal plan history: meal_search has one row per
+# distinct dish (rowid = meal_dishes.id), week_search one row per meal plan (rowid =
+# meal_plans.id). Indexing distinct dishes keeps a search proportional to the number of
+# different dishes rather than to every meal ever planned. Porter stemming lets "eggs"
+# match "egg".
+MEAL_SEARCH_ENABLED = engine.dialect.name == "sqlite"
+MEAL_TYPES = ["breakfast", "lunch", "dinner"]
+MEAL_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS meal_search USING fts5(dish, ingredients, tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS week_search USING fts5(preferences, dishes, ingredients, tokenize='porter unicode61')",
+]
+for ddl in MEAL_SEARCH_DDL:
+    event.listen(MealPlan.__table__, "after_create", DDL(ddl).execute_if(dialect="sqlite"))
+for table in ["meal_search", "week_search"]:
+    event.listen(MealPlan.__table__, "after_drop", DDL(f"DROP TABLE IF EXISTS {table}").execute_if(dialect="sqlite"))
+
+def _plan_meals(meal_plan):
+    """(day, meal type, dish name, ingredients) for each meal of a plan."""
+    for day, meals in meal_plan.items():
+        if not isinstance(meals, list):
+            continue
+        for index, meal in enumerate(meals):
+            if isinstance(meal, list) and meal and str(meal[0]).strip():
+                meal_type = MEAL_TYPES[index] if index < len(MEAL_TYPES) else str(index)
+                yield day, meal_type, str(meal[0]).strip(), ", ".join(str(i) for i in meal[1:])
+
+def _index_meal_plan(connection, plan_id, meal_plan, preferences):
+    """Add a plan's dishes, meal occurrences and week document to the search indexes."""
+    meals = list(_plan_meals(meal_plan))
+    if not meals:
+        return
+    keys = {dish.lower(): (dish, ingredients) for _, _, dish, ingredients in meals}
+    dish_ids = dict(connection.execute(
+        MealDish.__table__.select().with_only_columns(MealDish.key, MealDish.id).where(MealDish.key.in_(keys))
+    ).all())
+    for key, (dish, ingredients) in keys.items():
+        if key not in dish_ids:
+            dish_id = connection.execute(
+                MealDish.__table__.insert().values(key=key, name=dish, ingredients=ingredients)
+            ).inserted_primary_key[0]
+            connection.execute(text("INSERT INTO meal_search (rowid, dish, ingredients) VALUES (:id, :dish, :ingredients)"),
+                               {"id": dish_id, "dish": dish, "ingredients": ingredients})
+            dish_ids[key] = dish_id
+    connection.execute(MealOccurrence.__table__.insert(), [
+        {"dish_id": dish_ids[dish.lower()], "meal_plan_id": plan_id, "day": day, "meal": meal_type}
+        for day, meal_type, dish, _ in meals
+    ])
+    connection.execute(text(
+        "INSERT INTO week_search (rowid, preferences, dishes, ingredients) VALUES (:id, :preferences, :dishes, :ingredients)"
+    ), {
+        "id": plan_id,
+        "preferences": preferences or "",
+        "dishes": "; ".join(dish for _, _, dish, _ in meals),
+        "ingredients": ", ".join(ingredients for _, _, _, ingredients in meals),
+    })
+
+@event.listens_for(MealPlan, "after_insert")
+def _index_new_meal_plan(mapper, connection, target):
+    """Index a meal plan in the same transaction that inserts it, whichever path saved it."""
+    if MEAL_SEARCH_ENABLED:
+        _index_meal_plan(connection, target.id, json.loads(target.data), target.preferences)
+
+def _rebuild_meal_search(connection):
+    for table in ["meal_search", "week_search"]:
+        connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    for ddl in MEAL_SEARCH_DDL:
+        connection.execute(text(ddl))
+    connection.execute(MealOccurrence.__table__.delete())
+    connection.execute(MealDish.__table__.delete())
+    for plan in connection.execute(text("SELECT id, data, preferences FROM meal_plans ORDER BY id")).all():
+        _index_meal_plan(connection, plan.id, json.loads(plan.data), plan.preferences)
+
+class CacheVersion(Base):
+    __tablename__ = 'cache_versions'
+    resource = Column(String, primary_key=True)  # Table name
+    version = Column(Integer, nullable=False, default=0)
+    modified_at = Column(String, nullable=True)  # UTC time of the last write, "YYYY-MM-DD HH:MM:SS.SSS"
+
+# Tables whose latest state is cached in each worker process. SQLite triggers bump a
+# table's version in the same transaction as any write to it, from any process or
+# code path (ORM, bulk deletes, write-behind batches), so workers only need to
+# compare versions to know what to reload.
+CACHED_TABLES = ["family_members", "activities", "meal_plans", "shopping_lists", "schedules"]
+CACHE_VERSIONS_ENABLED = engine.dialect.name == "sqlite"
+
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+def _install_version_triggers(connection):
+    for table in CACHED_TABLES:
+        connection.execute(text(
+            f"INSERT OR IGNORE INTO cache_versions (resource, version, modified_at) VALUES (:table, 0, {SQLITE_NOW})"
+        ), {"table": table})
+        for operation in ["INSERT", "UPDATE", "DELETE"]:
+            connection.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS bump_{table}_{operation.lower()} AFTER {operation} ON {table} "
+                f"BEGIN UPDATE cache_versions SET version = version + 1, modified_at = {SQLITE_NOW} "
+                f"WHERE resource = '{table}'; END"
+            ))
+
+# Schema migrations. Tables missing from the database are created from the models;
+# columns and indexes added to existing tables since the first release are added
+# by the migrations below, each recorded in schema_migrations once applied.
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+def _add_columns(connection, model, names):
+    """ALTER TABLE ADD COLUMN for the model's columns the table does not have yet."""
+    existing = {column["name"] for column in inspect(connection).get_columns(model.__tablename__)}
+    for name in names:
+        if name in existing:
+            continue
+        column_type = model.__table__.c[name].type.compile(dialect=connection.dialect)
+        try:
+            connection.execute(text(f"ALTER TABLE {model.__tablename__} ADD COLUMN {name} {column_type}"))
+        except OperationalError as e:
+            # Already added by someone else: the migration still succeeds
+            if "duplicate column" not in str(e).lower():
+                raise
+
+def _migrate_meal_plan_links(connection):
+    _add_columns(connection, MealPlan, ["preferences"])
+    _add_columns(connection, ShoppingList, ["meal_plan_id"])
+
+def _migrate_meal_search(connection):
+    if MEAL_SEARCH_ENABLED:
+        _rebuild_meal_search(connection)
+
+def _legacy_days(value):
+    """Day names of a stored days value: a JSON list, or plain text such as "Monday, Wednesday"."""
+    try:
+        days = json.loads(value or "[]")
+    except ValueError:
+        days = value.split(",")
+    if not isinstance(days, list):
+        days = [days]
+    return [str(day).strip() for day in days if str(day).strip()]
+
+def _migrate_temporal_columns(connection):
+    """Add the parsed time/date columns and weekday rows to activities saved before they existed.
+
+    Times are normalized to HH:MM and days stored as a JSON list of canonical day
+    names ("tue" -> "Tuesday"). Values that cannot
+    be parsed are left NULL and logged; activities with no parseable day are listed
+    after the week in schedules (see load_schedule).
+    """
+    _add_columns(connection, Activity, ["time_minutes", "date_ordinal"])
+    for index in Activity.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    # Activities without weekday rows: saved before they existed
+    rows = connection.execute(text(
+        "SELECT id, name, time, date, days FROM activities "
+        "WHERE NOT EXISTS (SELECT 1 FROM activity_days WHERE activity_id = activities.id)"
+    )).all()
+    for row in rows:
+        # One malformed row must not stop the others from being migrated
+        try:
+            values = {"id": row.id, "time": row.time, "time_minutes": None, "date_ordinal": None}
+            try:
+                values["time_minutes"] = parse_time(row.time)
+                values["time"] = format_time(values["time_minutes"])
+            except ValueError:
+                logger.warning("Activity %r: unparseable time %r", row.name, row.time)
+            try:
+                values["date_ordinal"] = parse_date(row.date)
+            except ValueError:
+                logger.warning("Activity %r: unparseable date %r", row.name, row.date)
+            weekdays, unparsed = set(), []
+            for day in _legacy_days(row.days):
+                try:
+                    weekdays.add(parse_weekday(day))
+                except ValueError:
+                    logger.warning("Activity %r: unparseable day %r", row.name, day)
+                    unparsed.append(day)
+            # Canonical names in week order, as new activities store them; unparseable
+            # values are kept so the activity still shows what was entered
+            values["days"] = json.dumps([DAYS_OF_WEEK[weekday] for weekday in sorted(weekdays)] + unparsed)
+        except Exception:
+            logger.exception("Activity %r: could not migrate, left unscheduled", row.name)
+            continue
+        connection.execute(text(
+            "UPDATE activities SET time = :time, days = :days, time_minutes = :time_minutes, "
+            "date_ordinal = :date_ordinal WHERE id = :id"
+        ), values)
+        if weekdays:
+            connection.execute(ActivityDay.__table__.insert(), [
+                {"activity_id": row.id, "weekday": weekday, "time_minutes": values["time_minutes"]}
+                for weekday in sorted(weekdays)
+            ])
+    logger.info("Migrated %d activities to typed time/date columns", len(rows))
+
+def _migrate_version_modified_at(connection):
+    """Record when each cached table last changed; the triggers are re-created to set it."""
+    if not CACHE_VERSIONS_ENABLED:
+        return
+    _add_columns(connection, CacheVersion, ["modified_at"])
+    connection.execute(text(f"UPDATE cache_versions SET modified_at = {SQLITE_NOW} WHERE modified_at IS NULL"))
+    for table in CACHED_TABLES:
+        for operation in ["insert", "update", "delete"]:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS bump_{table}_{operation}"))
+
+MIGRATIONS = [
+    ("meal_plan_links", _migrate_meal_plan_links),
+    ("meal_search", _migrate_meal_search),
+    ("activity_temporal_columns", _migrate_temporal_columns),
+    ("cache_version_modified_at", _migrate_version_modified_at),
+]
+
+@contextmanager
+def _schema_lock():
+    """Connection in a transaction holding the database write lock until the block exits.
+
+    On SQLite, BEGIN IMMEDIATE makes other worker processes starting at the same
+    time wait here, then see the finished schema instead of racing to change it.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        sqlite = engine.dialect.name == "sqlite"
+        if sqlite:
+            connection.exec_driver_sql(f"PRAGMA busy_timeout={SCHEMA_LOCK_TIMEOUT_MS}")
+        connection.exec_driver_sql("BEGIN IMMEDIATE" if sqlite else "BEGIN")
+        try:
+            yield connection
+            connection.exec_driver_sql("COMMIT")
+        except Exception:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        finally:
+            if sqlite:
+                connection.exec_driver_sql(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+
+def migrate_schema():
+    """Create missing tables and apply pending migrations in one transaction, one worker at a time."""
+    with _schema_lock() as connection:
+        Base.metadata.create_all(connection)
+        applied = set(connection.execute(select(SchemaMigration.name)).scalars())
+        for name, migrate in MIGRATIONS:
+            if name in applied:
+                continue
+            logger.info("Applying schema migration %s", name)
+            migrate(connection)
+            connection.execute(SchemaMigration.__table__.insert().values(name=name))
+        if CACHE_VERSIONS_ENABLED:
+            _install_version_triggers(connection)
+
+migrate_schema()
+
+_cache = VersionedCache()
+
+def read_versions():
+    """Current version of each cached table, in one query; empty when versions are unavailable."""
+    if not CACHE_VERSIONS_ENABLED:
+        return {}
+    with engine.connect() as connection:
+        return dict(connection.execute(text("SELECT resource, version FROM cache_versions")).all())
+
+def read_change(resource):
+    """(version, naive UTC time of the last write) of a cached table, or None when unavailable.
+
+    Unlike row timestamps, both change on deletes too.
+    """
+    if not CACHE_VERSIONS_ENABLED:
+        return None
+    with engine.connect() as connection:
+        row = connection.execute(text("SELECT version, modified_at FROM cache_versions WHERE resource = :resource"),
+                                 {"resource": resource}).first()
+    if row is None:
+        return None
+    return row.version, datetime.fromisoformat(row.modified_at) if row.modified_at else None
+
+# Unit of work: helpers called inside unit_of_work() share its session and commit once
+_current_session = contextvars.ContextVar("current_session", default=None)
+
+@contextmanager
+def unit_of_work():
+    """Run every db helper called in this block in one transaction, committed on exit."""
+    if _current_session.get() is not None:
+        # Nested unit of work joins the outer transaction
+        yield _current_session.get()
+        return
     session = Session()
+    token = _current_session.set(session)
     try:
-        # Load latest family members
-        family_members = session.query(FamilyMember).order_by(FamilyMember.timestamp.desc()).all()
-        family_members_data = [fm.name for fm in family_members] if family_members else []
-
-        # Load latest activities
-        activities = session.query(Activity).order_by(Activity.timestamp.desc()).all()
-        activities_data = [
-            {
-                "name": a.name,
-                "time": a.time,
-                "days": json.loads(a.days),
-                "location": a.location,
-                "caregiver": a.caregiver,
-                "repetition": a.repetition,
-                "driver_required": a.driver_required,  # Include driver_required
-                "date": a.date  # Include date
-            } for a in activities
-        ] if activities else []
+        yield session
+        session.commit()
+        deferred = session.info.pop("deferred_snapshots", [])
+        if deferred:
+            _write_behind.submit(deferred)
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        _current_session.reset(token)
+        session.close()
+
+@contextmanager
+def session_scope():
+    """Session of the active unit of work, or a new session committed on exit."""
+    session = _current_session.get()
+    if session is not None:
+        yield session
+        return
+    session = Session()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+class WriteBehindQueue:
+    """Coalesce snapshot inserts arriving within a short window into a single commit.
+
+    A failed commit keeps its rows queued, ahead of later ones, and is retried with
+    exponential backoff; readers flushing the queue get the error instead of stale
+    data. Attempts are counted per submit, so rows that failed WRITE_BEHIND_RETRIES
+    commits are dropped and their futures fail, while rows merged into a later retry
+    keep their own attempts.
+    """
+
+    def __init__(self, window_ms):
+        self.window = window_ms / 1000
+        self.commits = 0
+        self._pending = []  # [rows, future, failed attempts] per submit, oldest first
+        self._cond = threading.Condition()
+        self._commit_lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, snapshots):
+        """Queue snapshot rows; rows submitted together are always committed together.
+
+        Returns a Future resolved once the rows are committed, or set to the commit
+        error if they are given up on.
+        """
+        future = Future()
+        with self._cond:
+            self._pending.append([list(snapshots), future, 0])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._cond:
+                while not self._pending:
+                    failures = 0
+                    self._cond.wait()
+            # Let more writes arrive before committing; back off after failures
+            time.sleep(min(self.window * 2 ** failures, WRITE_BEHIND_MAX_BACKOFF) if failures else self.window)
+            try:
+                self.flush()
+                failures = 0
+            except Exception as error:
+                failures += 1
+                logger.warning("Write-behind commit failed (%d in a row): %s", failures, error)
+
+    def flush(self):
+        """Commit everything queued so far; readers call this to see their own writes.
+
+        Raises the commit error, leaving the rows queued for the next attempt unless
+        they have used up their retries.
+        """
+        with self._commit_lock:
+            with self._cond:
+                groups, self._pending = self._pending, []
+            if not groups:
+                return
+            session = Session()
+            try:
+                session.add_all([row for rows, _, _ in groups for row in rows])
+                session.commit()
+            except Exception as error:
+                session.rollback()
+                retry, dropped = [], []
+                for group in groups:
+                    for row in group[0]:
+                        # Let the retry take fresh ids; another process may use these meanwhile
+                        row.id = None
+                    group[2] += 1
+                    (dropped if group[2] >= WRITE_BEHIND_RETRIES else retry).append(group)
+                with self._cond:
+                    self._pending[:0] = retry
+                if dropped:
+                    logger.error("Write-behind commit failed %d times; dropping %d snapshot rows: %s",
+                                 WRITE_BEHIND_RETRIES, sum(len(rows) for rows, _, _ in dropped), error)
+                for _, future, _ in dropped:
+                    future.set_exception(error)
+                raise
+            finally:
+                session.close()
+            self.commits += 1
+        for _, future, _ in groups:
+            future.set_result(None)
 
-        # Load latest meal plan
-        meal_plan = session.query(MealPlan).order_by(MealPlan.timestamp.desc()).first()
-        meal_plan_data = json.loads(meal_plan.data) if meal_plan else {}
+_write_behind = WriteBehindQueue(WRITE_BEHIND_MS) if WRITE_BEHIND_MS > 0 else None
+if _write_behind is not None:
+    atexit.register(_write_behind.flush)
 
-        # Load latest shopping list
-        shopping_list = session.query(ShoppingList).order_by(ShoppingList.timestamp.desc()).first()
-        shopping_list_data = json.loads(shopping_list.data) if shopping_list else {}
+def _wait_for_pending_writes():
+    if _write_behind is not None:
+        _write_behind.flush()
 
-        # Load latest schedule
-        schedule = session.query(Schedule).order_by(Schedule.timestamp.desc()).first()
-        schedule_data = json.loads(schedule.data) if schedule else []
+def _save_snapshot(snapshot):
+    """Insert a snapshot row now, or hand it to the write-behind queue when enabled."""
+    if _write_behind is None:
+        with session_scope() as session:
+            session.add(snapshot)
+        return
+    session = _current_session.get()
+    if session is not None:
+        # Queued once the unit of work commits, together with its other snapshots
+        session.info.setdefault("deferred_snapshots", []).append(snapshot)
+    else:
+        _write_behind.submit([snapshot])
 
+def _load_family_members(session):
+    family_members = session.query(FamilyMember).order_by(FamilyMember.timestamp.desc()).all()
+    return [fm.name for fm in family_members] if family_members else []
+
+def _load_activities(session):
+    activities = session.query(Activity).order_by(Activity.timestamp.desc()).all()
+    return [
+        {
+            "name": a.name,
+            "time": a.time,
+            "days": json.loads(a.days),
+            "location": a.location,
+            "caregiver": a.caregiver,
+            "repetition": a.repetition,
+            "driver_required": a.driver_required,  # Include driver_required
+            "date": a.date,  # Include date
+            "time_minutes": a.time_minutes,
+            "date_ordinal": a.date_ordinal
+        } for a in activities
+    ] if activities else []
+
+def _load_latest_snapshot(session, table, default):
+    snapshot = session.query(table).order_by(table.timestamp.desc()).first()
+    return json.loads(snapshot.data) if snapshot else default
+
+def load_latest_data():
+    """Load the latest data from the database.
+
+    Each part is served from the in-process cache unless its table changed since it
+    was loaded, in this or any other worker process. The returned values are shared
+    with later calls, so callers must not modify them.
+    """
+    _wait_for_pending_writes()
+    # Inside a unit of work, read its uncommitted changes directly and keep them out of the cache
+    versions = read_versions() if _current_session.get() is None else {}
+    with session_scope() as session:
         return {
-            "family_members": family_members_data,
-            "activities": activities_data,
-            "meal_plan": meal_plan_data,
-            "shopping_list": shopping_list_data,
-            "schedule": schedule_data
+            "family_members": _cache.get("family_members", versions.get("family_members"),
+                                         lambda: _load_family_members(session)),
+            "activities": _cache.get("activities", versions.get("activities"),
+                                     lambda: _load_activities(session)),
+            "meal_plan": _cache.get("meal_plans", versions.get("meal_plans"),
+                                    lambda: _load_latest_snapshot(session, MealPlan, {})),
+            "shopping_list": _cache.get("shopping_lists", versions.get("shopping_lists"),
+                                        lambda: _load_latest_snapshot(session, ShoppingList, {})),
+            "schedule": _cache.get("schedules", versions.get("schedules"),
+                                   lambda: _load_latest_snapshot(session, Schedule, [])),
         }
-    finally:
-        session.close()
 
 def get_timestamps(table):
     """Get list of timestamps for a given table."""
+    _wait_for_pending_writes()
     session = Session()
     try:
         timestamps = session.query(table.timestamp).distinct().order_by(table.timestamp.desc()).all()
@@ -107,6 +605,7 @@ def get_timestamps(table):
 
 def load_data_by_timestamp(table, timestamp, key):
     """Load data from a table for a specific timestamp."""
+    _wait_for_pending_writes()
     session = Session()
     try:
         data = session.query(table).filter(table.timestamp == datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")).all()
@@ -130,89 +629,312 @@ def load_data_by_timestamp(table, timestamp, key):
     finally:
         session.close()
 
-def save_family_member(name):
-    """Save a family member to the database."""
-    session = Session()
-    try:
-        new_member = FamilyMember(name=name)
-        session.add(new_member)
-        session.commit()
-    finally:
-        session.close()
+def rebuild_meal_search():
+    """Re-create the meal search indexes from every stored meal plan."""
+    if not MEAL_SEARCH_ENABLED:
+        return
+    _wait_for_pending_writes()
+    with engine.begin() as connection:
+        _rebuild_meal_search(connection)
 
-def save_activity(activity):
-    """Save an activity to the database."""
-    session = Session()
-    try:
-        db_activity = Activity(
-            name=activity["name"],
-            time=activity["time"],
-            days=json.dumps(activity["days"]),
-            location=activity["location"],
-            caregiver=activity["caregiver"],
-            repetition=activity["repetition"],
-            driver_required=activity.get("driver_required", False),  # Save driver_required
-            date=activity["date"]  # Save date
+def _fts_query(query, operator):
+    """Quote each word of a free-text query so FTS5 syntax characters are matched literally."""
+    words = re.findall(r"\w+", query.lower())
+    return f" {operator} ".join(f'"{word}"' for word in words)
+
+def search_meal_history(query, limit=10):
+    """Past dishes and weeks matching a free-text query, best match first.
+
+    Dishes rank on name before ingredients; weeks on the preferences they were
+    generated from, then dish names, then ingredients. All words must match; if
+    nothing does, any word may match.
+    """
+    if not MEAL_SEARCH_ENABLED:
+        raise RuntimeError("Meal search requires SQLite with FTS5")
+    _wait_for_pending_writes()
+    with session_scope() as session:
+        for operator in ("AND", "OR"):
+            match = _fts_query(query, operator)
+            if not match:
+                return {"dishes": [], "weeks": []}
+            dishes = session.execute(text(
+                "SELECT rowid AS id, dish, ingredients, bm25(meal_search, 10.0, 1.0) AS score "
+                "FROM meal_search WHERE meal_search MATCH :match ORDER BY score LIMIT :limit"
+            ), {"match": match, "limit": limit}).all()
+            weeks = session.execute(text(
+                "SELECT rowid AS id, preferences, bm25(week_search, 5.0, 2.0, 1.0) AS score "
+                "FROM week_search WHERE week_search MATCH :match ORDER BY score LIMIT :limit"
+            ), {"match": match, "limit": limit}).all()
+            if dishes or weeks:
+                break
+
+        # How often each matching dish was planned, and where it was planned last
+        history = {}
+        if dishes:
+            history = {
+                dish_id: {"times": times, "plan_id": plan_id}
+                for dish_id, times, plan_id in session.query(
+                    MealOccurrence.dish_id, func.count(MealOccurrence.id), func.max(MealOccurrence.meal_plan_id)
+                ).filter(MealOccurrence.dish_id.in_([row.id for row in dishes])).group_by(MealOccurrence.dish_id)
+            }
+            for dish_id, plan_id, day, meal in session.query(
+                MealOccurrence.dish_id, MealOccurrence.meal_plan_id, MealOccurrence.day, MealOccurrence.meal
+            ).filter(MealOccurrence.dish_id.in_(history),
+                     MealOccurrence.meal_plan_id.in_({h["plan_id"] for h in history.values()})):
+                if plan_id == history[dish_id]["plan_id"]:
+                    history[dish_id].setdefault("slot", (day, meal))
+        plan_ids = {h["plan_id"] for h in history.values()} | {row.id for row in weeks}
+        timestamps = dict(session.query(MealPlan.id, MealPlan.timestamp).filter(MealPlan.id.in_(plan_ids)).all())
+
+        def stamp(plan_id):
+            return timestamps[plan_id].strftime("%Y-%m-%d %H:%M:%S") if plan_id in timestamps else None
+
+        return {
+            "dishes": [{
+                "dish": row.dish,
+                "ingredients": row.ingredients,
+                "times_planned": history.get(row.id, {}).get("times", 0),
+                "meal_plan_id": history.get(row.id, {}).get("plan_id"),
+                "day": history.get(row.id, {}).get("slot", (None, None))[0],
+                "meal": history.get(row.id, {}).get("slot", (None, None))[1],
+                "timestamp": stamp(history.get(row.id, {}).get("plan_id")),
+                "score": round(-row.score, 4),
+            } for row in dishes],
+            "weeks": [{
+                "meal_plan_id": row.id,
+                "preferences": row.preferences,
+                "timestamp": stamp(row.id),
+                "score": round(-row.score, 4),
+            } for row in weeks],
+        }
+
+def load_meal_plan(plan_id):
+    """A stored meal plan with its preferences and the shopping list built for it, or None."""
+    _wait_for_pending_writes()
+    with session_scope() as session:
+        plan = session.get(MealPlan, plan_id)
+        if plan is None:
+            return None
+        shopping_list = (
+            session.query(ShoppingList).filter(ShoppingList.meal_plan_id == plan_id)
+            .order_by(ShoppingList.timestamp.desc()).first()
         )
-        session.add(db_activity)
-        session.commit()
-    finally:
-        session.close()
+        return {
+            "meal_plan": json.loads(plan.data),
+            "preferences": plan.preferences or "",
+            "shopping_list": json.loads(shopping_list.data) if shopping_list else None,
+        }
 
-def update_activity(old_name, new_activity):
-    """Update an activity in the database."""
+def latest_meal_plan_preferences():
+    """Preferences the latest meal plan was generated from ("" when none were recorded)."""
+    _wait_for_pending_writes()
+    with session_scope() as session:
+        preferences = session.query(MealPlan.preferences).order_by(MealPlan.timestamp.desc()).limit(1).scalar()
+        return preferences or ""
+
+def count_table_rows():
+    """Count rows in each snapshot table."""
     session = Session()
     try:
-        session.query(Activity).filter(Activity.name == old_name).delete()
-        session.add(Activity(
-            name=new_activity["name"],
-            time=new_activity["time"],
-            days=json.dumps(new_activity["days"]),
-            location=new_activity["location"],
-            caregiver=new_activity["caregiver"],
-            repetition=new_activity["repetition"]
-        ))
-        session.commit()
+        return {
+            table.__tablename__: session.query(table).count()
+            for table in [FamilyMember, Activity, MealPlan, ShoppingList, Schedule]
+        }
     finally:
         session.close()
 
-def delete_activity(name):
-    """Delete an activity from the database."""
+def activities_state(driver_only=False):
+    """Row count, highest id and latest timestamp of the activities, in one aggregate query."""
     session = Session()
     try:
-        session.query(Activity).filter(Activity.name == name).delete()
-        session.commit()
+        query = session.query(func.count(Activity.id), func.max(Activity.id), func.max(Activity.timestamp))
+        if driver_only:
+            query = query.filter(Activity.driver_required.is_(True))
+        return query.one()
     finally:
         session.close()
 
-def save_meal_plan(meal_plan):
-    """Save a meal plan to the database."""
+def iter_activities(driver_only=False, batch_size=500):
+    """Yield activities as dicts, fetching rows in batches instead of loading the table."""
     session = Session()
     try:
-        session.add(MealPlan(data=json.dumps(meal_plan)))
-        session.commit()
+        query = session.query(Activity)
+        if driver_only:
+            query = query.filter(Activity.driver_required.is_(True))
+        for a in query.order_by(Activity.id).yield_per(batch_size):
+            yield {
+                "id": a.id,
+                "name": a.name,
+                "time": a.time,
+                "days": json.loads(a.days),
+                "location": a.location,
+                "caregiver": a.caregiver,
+                "repetition": a.repetition,
+                "driver_required": a.driver_required,
+                "date": a.date,
+                "time_minutes": a.time_minutes,
+                "date_ordinal": a.date_ordinal
+            }
     finally:
         session.close()
 
-def save_shopping_list(shopping_list):
-    """Save a shopping list to the database."""
+# Tables available to bulk export, and their columns holding JSON text
+EXPORT_TABLES = {
+    "family_members": FamilyMember,
+    "activities": Activity,
+    "meal_plans": MealPlan,
+    "shopping_lists": ShoppingList,
+    "schedules": Schedule,
+}
+JSON_COLUMNS = {"days", "data"}
+
+def export_columns(table_name):
+    return [column.name for column in EXPORT_TABLES[table_name].__table__.columns]
+
+def iter_export_rows(table_name, since=None, until=None, batch_size=1000, decode_json=True):
+    """Yield a table's rows as dicts in id order, optionally limited to a timestamp range.
+
+    Rows come from one streaming cursor fetched batch_size rows at a time and no ORM
+    objects are built, so memory use does not grow with the table. since and until
+    are naive UTC datetimes, both inclusive.
+    """
+    table = EXPORT_TABLES[table_name].__table__
+    query = select(table).order_by(table.c.id)
+    if since is not None:
+        query = query.where(table.c.timestamp >= since)
+    if until is not None:
+        query = query.where(table.c.timestamp <= until)
+    json_columns = [name for name in export_columns(table_name) if name in JSON_COLUMNS] if decode_json else []
+    _wait_for_pending_writes()
     session = Session()
     try:
-        session.add(ShoppingList(data=json.dumps(shopping_list)))
-        session.commit()
+        result = session.execute(query, execution_options={"yield_per": batch_size})
+        for batch in result.mappings().partitions():
+            for row in batch:
+                row = dict(row)
+                for name in json_columns:
+                    row[name] = json.loads(row[name]) if row[name] is not None else None
+                yield row
     finally:
         session.close()
 
+def save_family_member(name):
+    """Save a family member to the database."""
+    with session_scope() as session:
+        session.add(FamilyMember(name=name))
+
+def _activity_row(activity):
+    """Activity row with its parsed time, date and weekdays; raises ValueError on malformed values."""
+    time_minutes = parse_time(activity["time"])
+    return Activity(
+        name=activity["name"],
+        time=format_time(time_minutes),
+        days=json.dumps(activity["days"]),
+        location=activity["location"],
+        caregiver=activity["caregiver"],
+        repetition=activity["repetition"],
+        driver_required=activity.get("driver_required", False),  # Save driver_required
+        date=activity["date"],  # Save date
+        time_minutes=time_minutes,
+        date_ordinal=parse_date(activity["date"]),
+        weekdays=[ActivityDay(weekday=weekday, time_minutes=time_minutes)
+                  for weekday in sorted({parse_weekday(day) for day in activity["days"]})]
+    )
+
+def _delete_activities_named(session, name):
+    # Bulk deletes skip ORM cascades, so remove the weekday rows first
+    ids = session.query(Activity.id).filter(Activity.name == name).scalar_subquery()
+    session.query(ActivityDay).filter(ActivityDay.activity_id.in_(ids)).delete(synchronize_session=False)
+    session.query(Activity).filter(Activity.name == name).delete(synchronize_session=False)
+
+def save_activity(activity):
+    """Save an activity to the database."""
+    with session_scope() as session:
+        session.add(_activity_row(activity))
+
+def update_activity(old_name, new_activity):
+    """Update an activity in the database."""
+    with session_scope() as session:
+        _delete_activities_named(session, old_name)
+        session.add(_activity_row(new_activity))
+
+def delete_activity(name):
+    """Delete an activity from the database."""
+    with session_scope() as session:
+        _delete_activities_named(session, name)
+
+def load_schedule(driver_only=False, weekday=None, start_minutes=None, end_minutes=None,
+                  from_date=None, to_date=None):
+    """Schedule entries (one per activity day) in week order, then by time, filtered and sorted in SQL.
+
+    weekday is a day number (Monday = 0); start_minutes/end_minutes bound the time of
+    day and from_date/to_date (ordinals) the activity date, all inclusive. Activities
+    with no parseable day (legacy rows) follow the week, with their stored days as
+    "day", unless a weekday is asked for.
+    """
+    with session_scope() as session:
+        def filtered(query, time_column):
+            if driver_only:
+                query = query.filter(Activity.driver_required.is_(True))
+            if start_minutes is not None:
+                query = query.filter(time_column >= start_minutes)
+            if end_minutes is not None:
+                query = query.filter(time_column <= end_minutes)
+            if from_date is not None:
+                query = query.filter(Activity.date_ordinal >= from_date)
+            if to_date is not None:
+                query = query.filter(Activity.date_ordinal <= to_date)
+            return query
+
+        def entry(day, a):
+            return {
+                "day": day,
+                "activity": a.name,
+                "time": a.time,
+                "location": a.location,
+                "caregiver": a.caregiver,
+                "driver_required": a.driver_required,
+                "date": a.date
+            }
+
+        query = filtered(session.query(ActivityDay.weekday, Activity)
+                         .join(Activity, ActivityDay.activity_id == Activity.id), ActivityDay.time_minutes)
+        if weekday is not None:
+            query = query.filter(ActivityDay.weekday == weekday)
+        # Rows whose time could not be parsed during migration sort last within their day
+        query = query.order_by(ActivityDay.weekday, ActivityDay.time_minutes.is_(None),
+                               ActivityDay.time_minutes, Activity.name)
+        schedule = [entry(DAYS_OF_WEEK[weekday_number], a) for weekday_number, a in query]
+        if weekday is None:
+            unscheduled = filtered(session.query(Activity).filter(
+                ~session.query(ActivityDay.id).filter(ActivityDay.activity_id == Activity.id).exists()
+            ), Activity.time_minutes).order_by(Activity.time_minutes.is_(None), Activity.time_minutes, Activity.name)
+            schedule.extend(entry(", ".join(_legacy_days(a.days)) or "Unscheduled", a) for a in unscheduled)
+        return schedule
+
+# Snapshot timestamps are set when saved, not when a write-behind batch is inserted
+def save_meal_plan(meal_plan, preferences=None):
+    """Save a meal plan to the database; returns the row to link a shopping list to."""
+    snapshot = MealPlan(data=json.dumps(meal_plan), preferences=preferences, timestamp=datetime.now(timezone.utc))
+    _save_snapshot(snapshot)
+    return snapshot
+
+def save_shopping_list(shopping_list, meal_plan=None):
+    """Save a shopping list to the database, optionally linked to the meal plan row it was built for."""
+    _save_snapshot(ShoppingList(data=json.dumps(shopping_list), meal_plan=meal_plan, timestamp=datetime.now(timezone.utc)))
+
 def save_schedule(schedule):
     """Save a schedule to the database."""
-    session = Session()
-    try:
-        session.add(Schedule(data=json.dumps(schedule)))
-        session.commit()
-    finally:
-        session.close()
+    _save_snapshot(Schedule(data=json.dumps(schedule), timestamp=datetime.now(timezone.utc)))
+
+def reset_database():
+    """Drop and recreate all tables to apply schema changes (deletes all data).
 
+    Stop every worker first: cache versions restart from zero.
+    """
+    Base.metadata.drop_all(engine)
+    migrate_schema()
+    _cache.invalidate()
 
-# Drop and recreate tables to apply schema changes
-Base.metadata.drop_all(engine)
-Base.metadata.create_all(engine)
\ No newline at end of file
+if __name__ == "__main__" and sys.argv[1:] == ["reset"]:
+    reset_database()
@@ -0,0 +1,120 @@
+import io
+import os
+import csv
+import json
+import time
+import tempfile
+import tracemalloc
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Rows serialized per chunk sent to the client
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Naive UTC datetime from an ISO 8601 date or datetime, as timestamps are stored."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp '{value}', use ISO 8601 such as 2025-06-09 or 2025-06-09T15:00:00Z")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_stream(tables: Iterable[Tuple[str, Iterable[Dict]]], batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[str]:
+    """One JSON object per line, tagged with its table, in chunks of batch_rows lines.
+
+    Each table's rows are only read once the previous table is done, so at most one
+    cursor is open and one chunk is held in memory at a time.
+    """
+    buffer: List[str] = []
+    for table, rows in tables:
+        for row in rows:
+            row["table"] = table
+            buffer.append(json.dumps(row, default=_json_default))
+            if len(buffer) >= batch_rows:
+                yield "\n".join(buffer) + "\n"
+                buffer = []
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+def csv_stream(columns: List[str], rows: Iterable[Dict], batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[str]:
+    """CSV with a header row, in chunks of batch_rows rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def main():
+    # Export a growing activities table and report the peak Python memory while
+    # streaming, against loading every row first as load_latest_data() does
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["FAMILY_PLANNER_DB_URL"] = f"sqlite:///{tmp}/export.db"
+        import db
+
+        inserted = 0
+
+        def grow_to(count):
+            nonlocal inserted
+            now = datetime.now(timezone.utc)
+            with db.engine.begin() as connection:
+                for batch_start in range(inserted, count, 10_000):
+                    connection.execute(db.Activity.__table__.insert(), [{
+                        "name": f"Activity {i}", "time": "15:00", "days": '["Monday", "Wednesday"]',
+                        "location": "Community Field", "caregiver": "Alice", "repetition": "weekly",
+                        "driver_required": i % 2 == 0, "date": "2025-06-09", "time_minutes": 900,
+                        "date_ordinal": 739411, "timestamp": now,
+                    } for i in range(batch_start, min(batch_start + 10_000, count))])
+            inserted = count
+
+        print(f"{'rows':>9} {'format':>7} {'seconds':>8} {'MiB out':>8} {'peak MiB':>9}")
+        for count in (10_000, 100_000, 1_000_000):
+            grow_to(count)
+            for fmt in ("ndjson", "csv"):
+                if fmt == "ndjson":
+                    stream = ndjson_stream([("activities", db.iter_export_rows("activities"))])
+                else:
+                    stream = csv_stream(db.export_columns("activities"),
+                                        db.iter_export_rows("activities", decode_json=False))
+                tracemalloc.start()
+                start = time.perf_counter()
+                size = sum(len(chunk) for chunk in stream)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f"{count:>9} {fmt:>7} {elapsed:8.1f} {size / 2**20:8.1f} {peak / 2**20:9.2f}")
+            if count == 100_000:
+                # The same rows materialized up front, as load_latest_data() does
+                tracemalloc.start()
+                with db.session_scope() as session:
+                    rows = db._load_activities(session)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                del rows
+                print(f"{count:>9} {'loaded':>7} {'':>8} {'':>8} {peak / 2**20:9.2f}")
+        db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import re
+import time
+import random
+from fractions import Fraction
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+# Units mapped to (canonical unit, factor to the base unit of its family).
+# Mass is summed in grams and volume in millilitres; other units are kept as-is.
+UNITS = {
+    "g": ("g", 1), "gram": ("g", 1), "grams": ("g", 1), "gr": ("g", 1),
+    "kg": ("g", 1000), "kilogram": ("g", 1000), "kilograms": ("g", 1000),
+    "oz": ("g", 28.35), "ounce": ("g", 28.35), "ounces": ("g", 28.35),
+    "lb": ("g", 453.6), "lbs": ("g", 453.6), "pound": ("g", 453.6), "pounds": ("g", 453.6),
+    "ml": ("ml", 1), "milliliter": ("ml", 1), "milliliters": ("ml", 1), "millilitre": ("ml", 1),
+    "l": ("ml", 1000), "liter": ("ml", 1000), "liters": ("ml", 1000), "litre": ("ml", 1000),
+    "tsp": ("ml", 5), "teaspoon": ("ml", 5), "teaspoons": ("ml", 5),
+    "tbsp": ("ml", 15), "tablespoon": ("ml", 15), "tablespoons": ("ml", 15),
+    "cup": ("ml", 240), "cups": ("ml", 240),
+    "clove": ("clove", 1), "cloves": ("clove", 1),
+    "can": ("can", 1), "cans": ("can", 1), "tin": ("can", 1), "tins": ("can", 1),
+    "bunch": ("bunch", 1), "bunches": ("bunch", 1),
+    "slice": ("slice", 1), "slices": ("slice", 1),
+    "pinch": ("pinch", 1), "pinches": ("pinch", 1),
+    "handful": ("handful", 1), "handfuls": ("handful", 1),
+}
+# Canonical units of the mass and volume families, which only ever lead the name
+MEASURED_UNITS = {"g", "ml"}
+# Words describing preparation or size that do not change what is bought
+DESCRIPTORS = {
+    "fresh", "freshly", "chopped", "diced", "minced", "sliced", "grated", "shredded", "crushed",
+    "ground", "large", "small", "medium", "ripe", "finely", "roughly", "thinly", "peeled",
+    "cooked", "boiled", "raw", "whole", "organic", "optional", "to", "taste", "about",
+}
+# Descriptors that are part of the product name and must survive cleanup
+KEEP_PHRASES = {"ground beef", "ground turkey", "ground pork", "whole wheat flour", "whole wheat bread"}
+
+UNICODE_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8"}
+QUANTITY = re.compile(
+    r"^(?P<quantity>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)"
+    r"(?:\s*(?:-|to)\s*(?P<upper>\d+/\d+|\d+(?:\.\d+)?))?\s*"
+)
+ARTICLE_QUANTITY = re.compile(r"^(?:a|an|one)\s+")
+
+# Singular forms that plain suffix rules get wrong
+SINGULAR_EXCEPTIONS = {
+    "leaves": "leaf", "loaves": "loaf", "halves": "half", "knives": "knife",
+    "potatoes": "potato", "tomatoes": "tomato", "mangoes": "mango",
+    "radishes": "radish", "dishes": "dish",
+}
+# Words that end in "s" but are not plurals
+INVARIANT = {"hummus", "couscous", "asparagus", "molasses", "swiss", "oats", "grits", "greens", "flakes"}
+
+# Canonical ingredient -> aliases, all compared after lemmatization
+SYNONYMS = {
+    "scallion": ["green onion", "spring onion", "scallion"],
+    "chickpea": ["garbanzo bean", "garbanzo", "chickpea"],
+    "cilantro": ["coriander leaf", "fresh coriander", "cilantro"],
+    "bell pepper": ["capsicum", "sweet pepper", "bell pepper"],
+    "eggplant": ["aubergine", "brinjal", "eggplant"],
+    "zucchini": ["courgette", "zucchini"],
+    "egg": ["egg", "whole egg"],
+    "olive oil": ["olive oil", "extra virgin olive oil", "evoo"],
+    "tomato": ["tomato", "roma tomato", "plum tomato"],
+    "garlic": ["garlic", "garlic clove"],
+    "onion": ["onion", "yellow onion", "white onion"],
+    "parmesan cheese": ["parmesan", "parmigiano reggiano", "parmesan cheese"],
+    "cheddar cheese": ["cheddar", "cheddar cheese"],
+    "mozzarella cheese": ["mozzarella", "mozzarella cheese"],
+    "yogurt": ["yogurt", "yoghurt", "plain yogurt", "curd"],
+    "rice": ["rice", "white rice"],
+}
+
+
+def singularize(word: str) -> str:
+    """Reduce an English plural noun to its singular form."""
+    if word in SINGULAR_EXCEPTIONS:
+        return SINGULAR_EXCEPTIONS[word]
+    if len(word) <= 3 or word in INVARIANT or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes", "sses", "oes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def lemmatize(name: str) -> str:
+    """Lowercase, strip descriptors and punctuation, and singularize the head noun."""
+    name = re.sub(r"\([^)]*\)", " ", name.lower())
+    name = re.sub(r"[^a-z\s-]", " ", name)
+    words = name.split()
+    phrase = " ".join(words)
+    if not any(keep in phrase for keep in KEEP_PHRASES):
+        words = [w for w in words if w not in DESCRIPTORS]
+    if words and words[0] == "of":
+        words = words[1:]
+    if not words:
+        return ""
+    # Only the last word of a compound name is inflected ("bell peppers" -> "bell pepper")
+    words[-1] = singularize(words[-1])
+    return " ".join(words)
+
+
+def _build_index() -> Dict[str, str]:
+    """Prebuilt lookup index from lemmatized alias to canonical ingredient name."""
+    index = {}
+    for canonical, aliases in SYNONYMS.items():
+        for alias in aliases:
+            index[lemmatize(alias)] = canonical
+    return index
+
+
+CANONICAL_INDEX = _build_index()
+
+
+def canonicalize(lemma: str) -> str:
+    """Map a lemmatized name to its canonical form, trying shorter suffixes for unknown modifiers."""
+    if lemma in CANONICAL_INDEX:
+        return CANONICAL_INDEX[lemma]
+    words = lemma.split()
+    # "red bell pepper" -> "bell pepper", but only when the suffix is a known ingredient
+    for start in range(1, len(words)):
+        suffix = " ".join(words[start:])
+        if suffix in CANONICAL_INDEX and len(words) - start > 1:
+            return CANONICAL_INDEX[suffix]
+    return lemma
+
+
+@lru_cache(maxsize=4096)
+def normalize_name(name: str) -> str:
+    """Lemmatize and canonicalize an ingredient name; cached since meal plans repeat names."""
+    return canonicalize(lemmatize(name))
+
+
+def _to_number(text: str) -> float:
+    return float(sum(Fraction(part) for part in text.split()))
+
+
+def parse_ingredient(text: str) -> Optional[Dict]:
+    """Parse "1 1/2 cups chopped tomatoes" into quantity, unit and canonical name."""
+    raw = text.strip()
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        raw = raw.replace(symbol, f" {fraction}")
+    rest = raw.lower().strip()
+
+    quantity = None
+    match = QUANTITY.match(rest)
+    if match:
+        # For ranges such as "2-3 eggs" buy the upper bound
+        quantity = _to_number(match.group("upper") or match.group("quantity"))
+        rest = rest[match.end():]
+    else:
+        # "an onion", "a pinch of salt"
+        article = ARTICLE_QUANTITY.match(rest)
+        if article:
+            quantity = 1.0
+            rest = rest[article.end():]
+
+    # Package sizes such as "1 (14 oz) can chickpeas" sit between quantity and unit
+    rest = re.sub(r"\([^)]*\)", " ", rest)
+    unit = None
+    tokens = rest.split(None, 1)
+    if tokens and tokens[0].rstrip(".") in UNITS:
+        unit, factor = UNITS[tokens[0].rstrip(".")]
+        quantity = (quantity if quantity is not None else 1.0) * factor
+        rest = tokens[1] if len(tokens) > 1 else ""
+    else:
+        # Trailing count units: "1 garlic clove" is the same item as "1 clove garlic"
+        words = lemmatize(rest).split()
+        if len(words) > 1 and words[-1] in UNITS and UNITS[words[-1]][0] not in MEASURED_UNITS:
+            unit = UNITS[words[-1]][0]
+            quantity = quantity if quantity is not None else 1.0
+            rest = " ".join(words[:-1])
+
+    name = normalize_name(rest)
+    if not name:
+        return None
+    if quantity is not None and unit is None:
+        unit = "count"
+    return {"name": name, "quantity": quantity, "unit": unit, "raw": text}
+
+
+def split_ingredients(text: str) -> List[str]:
+    """Split a meal's comma separated ingredient string."""
+    return [part.strip() for part in re.split(r",\s*", text) if part.strip()]
+
+
+def aggregate_ingredients(ingredients: Iterable[str]) -> Dict[str, Dict]:
+    """Sum quantities per canonical ingredient and unit, preserving first-seen order.
+
+    Returns {name: {"quantities": {unit: total}, "mentions": n}}.
+    """
+    totals: Dict[str, Dict] = {}
+    for text in ingredients:
+        parsed = parse_ingredient(text)
+        if parsed is None:
+            continue
+        entry = totals.setdefault(parsed["name"], {"quantities": {}, "mentions": 0})
+        entry["mentions"] += 1
+        if parsed["quantity"] is not None:
+            quantities = entry["quantities"]
+            quantities[parsed["unit"]] = quantities.get(parsed["unit"], 0) + parsed["quantity"]
+    return totals
+
+
+def meal_plan_ingredients(meal_plan: Dict[str, List[List[str]]]) -> List[str]:
+    """All raw ingredient strings in a meal plan, in day and meal order."""
+    ingredients = []
+    for meals in meal_plan.values():
+        for meal in meals:
+            if len(meal) > 1:
+                ingredients.extend(split_ingredients(meal[1]))
+    return ingredients
+
+
+def _format_quantity(value: float, unit: str) -> str:
+    if unit == "g" and value >= 1000:
+        value, unit = value / 1000, "kg"
+    elif unit == "ml" and value >= 1000:
+        value, unit = value / 1000, "l"
+    number = f"{value:.2f}".rstrip("0").rstrip(".")
+    return number if unit == "count" else f"{number} {unit}"
+
+
+def format_item(name: str, entry: Dict) -> str:
+    """Render an aggregated ingredient, e.g. "egg (6)" or "olive oil (60 ml)"."""
+    if not entry["quantities"]:
+        return name
+    amounts = ", ".join(_format_quantity(value, unit) for unit, value in entry["quantities"].items())
+    return f"{name} ({amounts})"
+
+
+def main():
+    # Benchmark throughput and the reduction in distinct items sent to the LLM
+    bases = ["egg", "tomato", "onion", "garlic clove", "bell pepper", "spinach", "olive oil",
+             "green onion", "chickpea", "potato", "cheddar", "mushroom", "berry", "carrot"]
+    forms = ["{b}", "{b}s", "2 {b}s", "1/2 cup {b}", "200g {b}", "1 1/2 tbsp chopped {b}",
+             "Fresh {b}s", "3-4 large {b}s", "½ cup diced {b}"]
+    random.seed(0)
+    for size in (1_000, 10_000, 100_000):
+        raw = [random.choice(forms).format(b=random.choice(bases)) for _ in range(size)]
+        start = time.perf_counter()
+        aggregated = aggregate_ingredients(raw)
+        elapsed = time.perf_counter() - start
+        exact_unique = len(dict.fromkeys(raw))
+        print(f"{size} ingredients: {size / elapsed:,.0f} items/s, "
+              f"{exact_unique} exact-unique -> {len(aggregated)} canonical "
+              f"({100 * (1 - len(aggregated) / exact_unique):.1f}% fewer items to the LLM)")
+    print(format_item("egg", aggregate_ingredients(["egg", "eggs", "2 eggs", "3-4 large eggs"])["egg"]))
+
+
+if __name__ == "__main__":
+    main()
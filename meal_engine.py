@@ -0,0 +1,298 @@
+import os
+import re
+import json
+import time
+from typing import Dict, List, Optional, Set
+
+from ingredients import normalize_name
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MEAL_TYPES = ["breakfast", "lunch", "dinner"]
+
+# Bundled recipe catalog: name, meal type, cuisine, diet tags and ingredients
+RECIPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recipes.json")
+
+CUISINES = {
+    "italian": "italian", "mexican": "mexican", "indian": "indian",
+    "mediterranean": "mediterranean", "greek": "mediterranean", "middle eastern": "mediterranean",
+    "asian": "asian", "chinese": "asian", "thai": "asian", "japanese": "asian",
+    "american": "american",
+}
+DIETS = {
+    "vegan": "vegan", "plant-based": "vegan", "plant based": "vegan",
+    "vegetarian": "vegetarian", "veggie": "vegetarian",
+    "gluten-free": "gluten-free", "gluten free": "gluten-free", "celiac": "gluten-free",
+}
+NON_VEGETARIAN = re.compile(r"\bnon[\s-]?veg(etarian)?\b")
+# Exclusion lists: "no onion no garlic", "without mushrooms or peppers, vegan", "allergic to nuts"
+EXCLUSION_TOKEN = re.compile(r"[a-z]+(?:-[a-z]+)*|[,.;!?&]")
+EXCLUSION_KEYWORDS = {"no", "without", "avoid", "exclude", "excluding", "allergic", "allergy", "allergies"}
+# Single-word exclusions: "dairy-free", "nut-free" ("gluten-free" is a diet tag)
+FREE_SUFFIX = re.compile(r"^([a-z]+(?:-[a-z]+)*)-free$")
+EXCLUSION_SEPARATORS = {",", "&", "and", "or", "nor"}
+EXCLUSION_END = {".", ";", "!", "?"}
+# Words skipped before an excluded ingredient ("without any nuts")
+EXCLUSION_ARTICLES = {"any", "the", "a", "an", "added", "more", "to"}
+# Words that end an exclusion list: diet and cuisine keywords plus filler around them
+EXCLUSION_STOP_WORDS = {word for keyword in list(CUISINES) + list(DIETS) for word in re.split(r"\s", keyword)} | {
+    "gluten", "please", "thanks", "thank", "you", "but", "with", "for", "in", "on", "at", "this", "that",
+    "meal", "meals", "dish", "dishes", "food", "recipe", "recipes", "week", "weekly", "day", "days",
+    "breakfast", "breakfasts", "lunch", "lunches", "dinner", "dinners", "plan", "menu",
+    "quick", "easy", "healthy", "spicy", "mild", "cheap", "simple", "kid", "kids", "family",
+}
+# Excluded words standing for a group of catalog ingredients
+EXCLUSION_GROUPS = {
+    "dairy": {"milk", "cheese", "butter", "cream", "yogurt", "ghee", "paneer", "queso fresco", "sour cream"},
+    "meat": {"chicken", "bacon", "ground beef", "chorizo"},
+    "seafood": {"fish", "salmon"},
+    "nut": {"peanut", "walnut", "cashew", "almond", "pine nut", "pistachio", "pecan", "hazelnut", "macadamia"},
+}
+# Group members that also name ingredients outside the group: "dairy" keeps "almond milk"
+EXCLUSION_GROUP_EXCEPTIONS = {
+    "dairy": {"almond milk", "coconut milk", "peanut butter"},
+}
+
+# Scoring weights: constraints the user asked for dominate ingredient overlap
+CUISINE_BONUS = 100
+PREFERENCE_BONUS = 50
+NEW_INGREDIENT_PENALTY = 1
+
+_catalog: Optional[List[Dict]] = None
+
+
+def load_catalog() -> List[Dict]:
+    """Load the bundled recipe catalog, caching it after the first call."""
+    global _catalog
+    if _catalog is None:
+        with open(RECIPES_PATH) as f:
+            recipes = json.load(f)
+        for recipe in recipes:
+            recipe["ingredient_set"] = frozenset(recipe["ingredients"])
+            recipe["normalized_ingredients"] = [normalize_name(i) for i in recipe["ingredients"]]
+        _catalog = recipes
+    return _catalog
+
+
+def parse_exclusions(text: str) -> Set[str]:
+    """Normalized ingredient names following "no", "without", "avoid", "exclude" or
+    "allergic to", plus the stem of words such as "dairy-free".
+
+    A list runs until a diet or cuisine word, filler such as "please" or "meals", or
+    the end of the sentence; commas, "and" and "or" separate its items.
+    """
+    excluded: Set[str] = set()
+    phrase: List[str] = []
+    listing = False
+
+    def finish():
+        if phrase:
+            name = normalize_name(" ".join(phrase))
+            if name:
+                excluded.add(name)
+            phrase.clear()
+
+    for token in EXCLUSION_TOKEN.findall(text):
+        free = FREE_SUFFIX.match(token)
+        if free and token not in DIETS:
+            finish()
+            listing = False
+            name = normalize_name(free.group(1).replace("-", " "))
+            if name:
+                excluded.add(name)
+        elif token in EXCLUSION_KEYWORDS:
+            finish()
+            listing = True
+        elif not listing:
+            continue
+        elif token in EXCLUSION_SEPARATORS:
+            finish()
+        elif token in EXCLUSION_END or token in EXCLUSION_STOP_WORDS:
+            finish()
+            listing = False
+        elif token in EXCLUSION_ARTICLES and not phrase:
+            continue
+        else:
+            phrase.append(token)
+    finish()
+    return excluded
+
+
+def parse_constraints(query: str) -> Dict:
+    """Extract cuisines, diet restrictions and excluded ingredients from a free-text query."""
+    text = query.lower()
+    non_vegetarian = bool(NON_VEGETARIAN.search(text))
+    # Drop the "non vegetarian" phrase so it does not also match "vegetarian"
+    scrubbed = NON_VEGETARIAN.sub(" ", text)
+
+    cuisines = {cuisine for keyword, cuisine in CUISINES.items() if re.search(rf"\b{keyword}\b", scrubbed)}
+    diets = {diet for keyword, diet in DIETS.items() if re.search(rf"\b{re.escape(keyword)}\b", scrubbed)}
+    if "vegan" in diets:
+        diets.add("vegetarian")
+    excluded = parse_exclusions(scrubbed)
+
+    return {
+        "cuisines": cuisines,
+        "diets": diets,
+        "non_vegetarian": non_vegetarian,
+        "excluded": excluded,
+    }
+
+
+def _allowed(recipe: Dict, constraints: Dict) -> bool:
+    """Check the hard constraints: diet tags and excluded ingredients."""
+    if not constraints["diets"].issubset(recipe["diets"]):
+        return False
+    for excluded in constraints["excluded"]:
+        # Whole words of the normalized names: "onions" matches "onion", "nut" not "walnut"
+        names = EXCLUSION_GROUPS.get(excluded, {excluded})
+        exceptions = EXCLUSION_GROUP_EXCEPTIONS.get(excluded, set())
+        for ingredient in recipe["normalized_ingredients"]:
+            if ingredient in exceptions:
+                continue
+            if any(re.search(rf"\b{re.escape(name)}\b", ingredient) for name in names):
+                return False
+    return True
+
+
+def _preference_score(recipe: Dict, constraints: Dict) -> int:
+    """Score the soft constraints: requested cuisine and meat preference."""
+    score = 0
+    if recipe["cuisine"] in constraints["cuisines"]:
+        score += CUISINE_BONUS
+    if constraints["non_vegetarian"] and "vegetarian" not in recipe["diets"]:
+        score += PREFERENCE_BONUS
+    return score
+
+
+def _score(recipe: Dict, pantry: Set[str], constraints: Dict) -> int:
+    """Preference score plus ingredient reuse, penalizing ingredients not yet on the list."""
+    return (
+        _preference_score(recipe, constraints)
+        + len(recipe["ingredient_set"] & pantry)
+        - NEW_INGREDIENT_PENALTY * len(recipe["ingredient_set"] - pantry)
+    )
+
+
+def _greedy_week(first: Dict, candidates: Dict[str, List[Dict]], constraints: Dict) -> List[Dict]:
+    """Fill the 21 slots in order, each time picking the recipe that reuses the most of the pantry."""
+    chosen = [first]
+    used = {first["name"]}
+    pantry: Set[str] = set(first["ingredient_set"])
+    slots = [meal_type for _ in DAYS for meal_type in MEAL_TYPES][1:]
+    for meal_type in slots:
+        options = [r for r in candidates[meal_type] if r["name"] not in used]
+        if not options:
+            # Fewer allowed recipes than days: repeat rather than break the diet
+            options = candidates[meal_type]
+        best = max(options, key=lambda r: (_score(r, pantry, constraints), r["name"]))
+        chosen.append(best)
+        used.add(best["name"])
+        pantry |= best["ingredient_set"]
+    return chosen
+
+
+def plan_week(query: str) -> Dict[str, List[List[str]]]:
+    """Build a WeeklyMealPlan-shaped dict from the local catalog, maximizing ingredient overlap."""
+    catalog = load_catalog()
+    constraints = parse_constraints(query)
+
+    candidates = {meal_type: [r for r in catalog if r["meal"] == meal_type and _allowed(r, constraints)]
+                  for meal_type in MEAL_TYPES}
+    if not all(candidates.values()):
+        # Nothing satisfies the diet for some meal type; keep the diet tags but drop exclusions
+        relaxed = dict(constraints, excluded=set())
+        candidates = {meal_type: [r for r in catalog if r["meal"] == meal_type and _allowed(r, relaxed)]
+                      for meal_type in MEAL_TYPES}
+    if not all(candidates.values()):
+        return {day: [] for day in DAYS}
+
+    # Greedy selection is sensitive to the first pick, so try every breakfast as a
+    # starting point and keep the week with the best preference score and smallest pantry
+    best_week, best_key = None, None
+    for first in candidates["breakfast"]:
+        week = _greedy_week(first, candidates, constraints)
+        preference = sum(_preference_score(r, constraints) for r in week)
+        pantry_size = len(set().union(*(r["ingredient_set"] for r in week)))
+        repeats = len(week) - len({r["name"] for r in week})
+        key = (repeats, -preference, pantry_size, first["name"])
+        if best_key is None or key < best_key:
+            best_week, best_key = week, key
+
+    meal_plan = {}
+    for i, day in enumerate(DAYS):
+        day_recipes = best_week[i * len(MEAL_TYPES):(i + 1) * len(MEAL_TYPES)]
+        meal_plan[day] = [[r["name"], ", ".join(r["ingredients"])] for r in day_recipes]
+    return meal_plan
+
+
+def with_meals(meal_plan: Dict[str, List[List[str]]], day: str, slots: List[str],
+               meals: List[List[str]]) -> Dict[str, List[List[str]]]:
+    """Return a copy of the plan with the given meal slots of one day replaced."""
+    updated = {d: [list(meal) for meal in day_meals] for d, day_meals in meal_plan.items()}
+    day_meals = updated.setdefault(day, [])
+    while len(day_meals) < len(MEAL_TYPES):
+        day_meals.append([])
+    for slot, meal in zip(slots, meals):
+        day_meals[MEAL_TYPES.index(slot)] = list(meal)
+    return updated
+
+
+def replace_meals(meal_plan: Dict[str, List[List[str]]], day: str, slots: List[str],
+                  query: str = "") -> Dict[str, List[List[str]]]:
+    """Replace some meal slots of one day from the catalog, reusing the rest of the week's ingredients."""
+    catalog = load_catalog()
+    constraints = parse_constraints(query)
+    replaced = {(day, MEAL_TYPES.index(slot)) for slot in slots}
+
+    # The meals being replaced count as used too, so the swap always changes the dish
+    used, pantry = set(), set()
+    for d, day_meals in meal_plan.items():
+        for i, meal in enumerate(day_meals):
+            if not meal:
+                continue
+            used.add(meal[0])
+            if (d, i) not in replaced and len(meal) > 1:
+                pantry.update(ingredient.strip().lower() for ingredient in meal[1].split(","))
+
+    meals = []
+    for slot in slots:
+        allowed = [r for r in catalog if r["meal"] == slot and _allowed(r, constraints)]
+        options = [r for r in allowed if r["name"] not in used] or allowed
+        if not options:
+            meals.append([])
+            continue
+        best = max(options, key=lambda r: (_score(r, pantry, constraints), r["name"]))
+        meals.append([best["name"], ", ".join(best["ingredients"])])
+        used.add(best["name"])
+        pantry |= best["ingredient_set"]
+    return with_meals(meal_plan, day, slots, meals)
+
+
+def unique_ingredients(meal_plan: Dict[str, List[List[str]]]) -> Set[str]:
+    """Distinct ingredients across a meal plan, split the same way shopping.py does."""
+    return {
+        ingredient
+        for meals in meal_plan.values()
+        for meal in meals if len(meal) > 1
+        for ingredient in meal[1].split(", ")
+    }
+
+
+def main():
+    queries = [
+        "Plan a week of indian non vegetarian spicy meals",
+        "vegetarian italian meals",
+        "vegan gluten-free week",
+        "quick mexican dinners without cheese",
+    ]
+    load_catalog()
+    for query in queries:
+        start = time.perf_counter()
+        meal_plan = plan_week(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{query!r}: {elapsed:.2f} ms, {len(unique_ingredients(meal_plan))} unique ingredients")
+        print(f"  monday: {[meal[0] for meal in meal_plan['monday']]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,35 @@
 import os
 import re
-from typing import List
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from typing_extensions import Annotated, TypedDict
+from metrics import timed_llm_call, record_llm_fallback
+from tracing import span
+from resilience import GROQ_BREAKER, LLM_TIMEOUT_SECONDS, ResilientCall, UpstreamUnavailable
+from meal_engine import DAYS, MEAL_TYPES, plan_week, replace_meals, with_meals
 
 # Load environment variables
 load_dotenv()
 groq_api_key = os.getenv("GROQ_API_KEY")
+# Primary planner: "llm" (Groq) or "engine" (local recipe catalog)
+MEAL_PLANNER = os.getenv("MEAL_PLANNER", "llm").lower()
+# Planner used when the LLM returns no tool call: "engine" or "text" (parse_text_fallback)
+MEAL_PLANNER_FALLBACK = os.getenv("MEAL_PLANNER_FALLBACK", "engine").lower()
 
-# Validate API key
-if not groq_api_key:
-    raise ValueError("GROQ_API_KEY is not set in environment variables")
+# Validate API key; the local engine planner runs without one
+if not groq_api_key and MEAL_PLANNER != "engine":
+    raise ValueError("GROQ_API_KEY is not set in environment variables (or set MEAL_PLANNER=engine)")
 
 # Initialize Groq model
 groq_model = ChatGroq(
     model_name="llama3-8b-8192",
     groq_api_key=groq_api_key,
-    max_retries=2
-)
+    # Retries, hedging and timeouts are handled by the resilience layer
+    max_retries=0,
+    timeout=LLM_TIMEOUT_SECONDS
+) if groq_api_key else None
 
 # Define WeeklyMealPlan as a TypedDict for tool usage
 class WeeklyMealPlan(TypedDict):
@@ -32,20 +42,54 @@ class WeeklyMealPlan(TypedDict):
     saturday: Annotated[List[List[str]], ..., "List of meals for Saturday"]
     sunday: Annotated[List[List[str]], ..., "List of meals for Sunday"]
 
+# Replacement meals for a partial regeneration of one day
+class MealReplacement(TypedDict):
+    """Replacement meals for the requested slots of one day."""
+    meals: Annotated[List[List[str]], ..., "One meal per requested slot, in the requested order; each meal is a list of dish name and ingredients"]
+
 # Bind the WeeklyMealPlan tool to the Groq model
-llm_with_tools = groq_model.bind_tools([WeeklyMealPlan])
+llm_with_tools = groq_model.bind_tools([WeeklyMealPlan]) if groq_model else None
+llm_with_replacement_tool = groq_model.bind_tools([MealReplacement]) if groq_model else None
 
-def weekly_meal_planner(query: str) -> List[dict]:
-    """Generate a weekly meal plan based on a user query, returning tool_calls output."""
-    # Create prompt to guide the LLM
-    prompt = ChatPromptTemplate.from_template(
-        """You are a nutritionist and dietitian. Based on the following user query, create a structured weekly meal plan using the WeeklyMealPlan tool. The plan should have meals for each day (monday to sunday), with three meals per day (breakfast, lunch, dinner). Each meal is a list of strings: the first string is the dish name, followed by its ingredients. Ensure the meals align with the cuisine, diet restrictions, and preferences mentioned in the query. Use lowercase day names.
+# Prompt to guide the LLM through a full weekly plan
+weekly_prompt = ChatPromptTemplate.from_template(
+    """You are a nutritionist and dietitian. Based on the following user query, create a structured weekly meal plan using the WeeklyMealPlan tool. The plan should have meals for each day (monday to sunday), with three meals per day (breakfast, lunch, dinner). Each meal is a list of strings: the first string is the dish name, followed by its ingredients. Ensure the meals align with the cuisine, diet restrictions, and preferences mentioned in the query. Use lowercase day names.
         
         Query: {query}"""
-    )
-    
-    chain = prompt | llm_with_tools
-    result = chain.invoke({"query": query})
+)
+
+# Prompt for replacing some meal slots of one day
+regenerate_prompt = ChatPromptTemplate.from_template(
+    """You are a nutritionist and dietitian. This is the current weekly meal plan (dish names only):
+{context}
+
+Using the MealReplacement tool, create new meals for the {slots} slot(s) on {day}, one meal per slot in that order. Each meal is a list of strings: the first string is the dish name, followed by its ingredients as one comma separated string. Do not repeat dishes already in the plan, prefer ingredients the plan already uses, and follow these preferences: {query}"""
+)
+
+# Budgeted, hedged calls sharing the Groq circuit breaker with shopping.py
+weekly_plan_call = ResilientCall("weekly_meal_planner", GROQ_BREAKER)
+meal_regenerate_call = ResilientCall("meal_regenerate", GROQ_BREAKER)
+
+def weekly_meal_planner(query: str) -> List[dict]:
+    """Generate a weekly meal plan based on a user query, returning tool_calls output."""
+    if MEAL_PLANNER == "engine":
+        with span("meal_engine.plan_week"):
+            meal_plan = plan_week(query)
+        return [{
+            "name": "WeeklyMealPlan",
+            "args": meal_plan,
+            "id": "engine_call",
+            "type": "tool_call"
+        }]
+
+    chain = weekly_prompt | llm_with_tools
+    try:
+        with span("llm.weekly_meal_planner"):
+            result = weekly_plan_call.call(
+                timed_llm_call("weekly_meal_planner", lambda: chain.invoke({"query": query})))
+    except UpstreamUnavailable:
+        # Upstream slow, failing or circuit open: go straight to the local fallback
+        result = None
     
     # Check for tool calls
     if hasattr(result, "tool_calls") and result.tool_calls:
@@ -61,7 +105,11 @@ def weekly_meal_planner(query: str) -> List[dict]:
         return result.tool_calls
     
     # Fallback: parse query as text if tool call fails
-    fallback_plan = parse_text_fallback(query)
+    record_llm_fallback("weekly_meal_planner")
+    if MEAL_PLANNER_FALLBACK == "engine":
+        fallback_plan = plan_week(query)
+    else:
+        fallback_plan = parse_text_fallback(query)
     # Simulate a tool call structure
     return [{
         "name": "WeeklyMealPlan",
@@ -70,6 +118,56 @@ def weekly_meal_planner(query: str) -> List[dict]:
         "type": "tool_call"
     }]
 
+def regenerate_meals(meal_plan: Dict, day: str, meal_type: Optional[str] = None, query: str = "") -> Dict:
+    """Regenerate one meal slot, or a whole day, of an existing plan and return the updated plan.
+
+    query should carry the preferences the plan was generated from (see
+    merge_preferences). The prompt only carries the dish names of the current week
+    as context, so it is much smaller than a full weekly_meal_planner call.
+    """
+    slots = [meal_type] if meal_type else list(MEAL_TYPES)
+    if MEAL_PLANNER == "engine":
+        with span("meal_engine.replace_meals"):
+            return replace_meals(meal_plan, day, slots, query)
+
+    chain = regenerate_prompt | llm_with_replacement_tool
+    inputs = _regenerate_inputs(meal_plan, day, slots, query)
+    try:
+        with span("llm.meal_regenerate"):
+            result = meal_regenerate_call.call(timed_llm_call("meal_regenerate", lambda: chain.invoke(inputs)))
+    except UpstreamUnavailable:
+        result = None
+
+    meals = None
+    for tool_call in getattr(result, "tool_calls", None) or []:
+        if tool_call["name"] == "MealReplacement":
+            meals = tool_call["args"].get("meals")
+    if isinstance(meals, list) and len(meals) == len(slots) and all(isinstance(m, list) and m for m in meals):
+        return with_meals(meal_plan, day, slots, meals)
+
+    # Fallback: pick replacements from the local recipe catalog, or the text fallback's meals
+    record_llm_fallback("meal_regenerate")
+    if MEAL_PLANNER_FALLBACK == "engine":
+        return replace_meals(meal_plan, day, slots, query)
+    fallback_day = parse_text_fallback(query)[day]
+    return with_meals(meal_plan, day, slots, [fallback_day[MEAL_TYPES.index(slot)] for slot in slots])
+
+def _regenerate_inputs(meal_plan: Dict, day: str, slots: List[str], query: str) -> Dict[str, str]:
+    context = "\n".join(
+        f"{d}: " + "; ".join(meal[0] for meal in meal_plan.get(d, []) if meal)
+        for d in DAYS
+    )
+    return {"context": context, "slots": ", ".join(slots), "day": day, "query": query or "none"}
+
+def merge_preferences(stored: Optional[str], requested: Optional[str]) -> str:
+    """Preferences of the plan being edited, plus any the request adds."""
+    stored, requested = (stored or "").strip(), (requested or "").strip()
+    if not requested or requested.lower() in stored.lower():
+        return stored
+    if not stored:
+        return requested
+    return f"{stored}. {requested}"
+
 def parse_text_fallback(query: str) -> WeeklyMealPlan:
     """Parse query text to create a fallback meal plan."""
     meal_plan = {
@@ -105,6 +203,67 @@ def parse_text_fallback(query: str) -> WeeklyMealPlan:
     
     return meal_plan
 import json
+def _approx_tokens(text: str) -> int:
+    # About four characters per token for English text and JSON
+    return max(1, round(len(text) / 4))
+
+def benchmark_regeneration(live: bool = False):
+    """Compare a full weekly regeneration with a one-meal and a one-day regeneration.
+
+    Offline, reports prompt and expected output sizes and the ingredients sent for
+    categorization, using a catalog plan as the current week. With live=True, also
+    runs each path against Groq and reports latency and the tokens it reported.
+    """
+    import sys
+    import time
+    from ingredients import aggregate_ingredients, meal_plan_ingredients
+    from shopping import prompt_template as categorize_prompt
+    from metrics import LLM_TOKENS
+
+    query = "vegetarian italian"
+    meal_plan = plan_week(query)
+    full_names = list(aggregate_ingredients(meal_plan_ingredients(meal_plan)))
+    cases = {
+        "full week": None,
+        "one meal": ("wednesday", ["lunch"]),
+        "one day": ("wednesday", list(MEAL_TYPES)),
+    }
+
+    print(f"{'regeneration':<12} {'prompt ~tok':>12} {'output ~tok':>12} {'categorized':>12} {'categorize ~tok':>16}")
+    for label, case in cases.items():
+        if case is None:
+            prompt = weekly_prompt.format(query=query)
+            output = json.dumps(meal_plan)
+            names = full_names
+        else:
+            day, slots = case
+            prompt = regenerate_prompt.format(**_regenerate_inputs(meal_plan, day, slots, query))
+            updated = replace_meals(meal_plan, day, slots, query)
+            output = json.dumps({"meals": [updated[day][MEAL_TYPES.index(slot)] for slot in slots]})
+            old = aggregate_ingredients(meal_plan_ingredients(meal_plan))
+            names = [name for name in aggregate_ingredients(meal_plan_ingredients(updated)) if name not in old]
+        categorize = categorize_prompt.format(ingredients=", ".join(names)) if names else ""
+        print(f"{label:<12} {_approx_tokens(prompt):>12} {_approx_tokens(output):>12} {len(names):>12} "
+              f"{_approx_tokens(categorize) if names else 0:>16}")
+
+    if not live:
+        return
+    from shopping import shopping_list_generator, update_shopping_list
+
+    print(f"\n{'live':<12} {'seconds':>8} {'tokens':>8}")
+    shopping_list = shopping_list_generator(meal_plan)
+    for label, case in cases.items():
+        before, start = LLM_TOKENS.total(), time.perf_counter()
+        if case is None:
+            new_plan = weekly_meal_planner(query)[0]["args"]
+            shopping_list_generator(new_plan)
+        else:
+            day, slots = case
+            new_plan = regenerate_meals(meal_plan, day, slots[0] if len(slots) == 1 else None, query)
+            update_shopping_list(shopping_list, meal_plan, new_plan)
+        print(f"{label:<12} {time.perf_counter() - start:8.2f} {LLM_TOKENS.total() - before:>8}")
+        sys.stdout.flush()
+
 def main():
     try:
         # Example usage
@@ -115,4 +274,8 @@ def main():
         print(f"Error occurred: {str(e)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    if sys.argv[1:2] == ["bench"]:
+        benchmark_regeneration(live="--live" in sys.argv)
+    else:
+        main()
\ No newline at end of file
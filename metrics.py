@@ -0,0 +1,309 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, from a fast SQLite query up to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label set such as {route="/x",role="Parent"}."""
+    parts = []
+    for name, value in zip(labelnames, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for a labelled metric family."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in sorted(items):
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self) -> float:
+        """Sum over every label set."""
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Gauge(_Metric):
+    """Value that can be set to an arbitrary number."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Histogram with fixed upper bounds; buckets are made cumulative only when rendered."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._values[key] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _render_series(self, key, value) -> List[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP metrics
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "family_http_request_duration_seconds", "HTTP request latency by route and role",
+    ("method", "route", "role")
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "family_http_requests_total", "HTTP requests by route, role and status code",
+    ("method", "route", "role", "status")
+))
+
+# Database metrics, collected through SQLAlchemy engine events
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    "family_db_query_duration_seconds", "SQL statement execution time by statement type",
+    ("statement",)
+))
+DB_QUERIES = REGISTRY.register(Counter(
+    "family_db_queries_total", "SQL statements executed by statement type",
+    ("statement",)
+))
+
+# LLM metrics
+LLM_CALL_DURATION = REGISTRY.register(Histogram(
+    "family_llm_call_duration_seconds", "Latency of LLM calls that reached the upstream, by call site",
+    ("call",)
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "family_llm_tokens_total", "LLM tokens used by call site and direction",
+    ("call", "kind")
+))
+LLM_FALLBACKS = REGISTRY.register(Counter(
+    "family_llm_fallbacks_total", "LLM calls that ended in the local fallback",
+    ("call",)
+))
+
+# Snapshot table sizes, refreshed on every scrape
+TABLE_ROWS = REGISTRY.register(Gauge(
+    "family_table_rows", "Row count per database table",
+    ("table",)
+))
+
+
+def render_metrics(table_counts: Optional[Dict[str, int]] = None) -> str:
+    """Render all metrics, refreshing the table row gauges first."""
+    for table, count in (table_counts or {}).items():
+        TABLE_ROWS.set(count, table=table)
+    return REGISTRY.render()
+
+
+def instrument_engine(engine):
+    """Count and time every SQL statement executed on the given SQLAlchemy engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("metrics_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        statement_type = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_DURATION.observe(elapsed, statement=statement_type)
+        DB_QUERIES.inc(statement=statement_type)
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        # A failed statement never reaches after_cursor_execute; drop its start time
+        # so later statements on this connection are not timed against it
+        conn = context.connection
+        starts = conn.info.get("metrics_query_start") if conn is not None else None
+        if starts:
+            starts.pop()
+
+
+def record_llm_usage(call: str, response) -> None:
+    """Record token counts from a LangChain chat model response, if it reports them."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens")
+    output_tokens = usage.get("output_tokens")
+    if input_tokens is None and output_tokens is None:
+        # Older langchain-groq versions only report usage in response_metadata
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        input_tokens = token_usage.get("prompt_tokens")
+        output_tokens = token_usage.get("completion_tokens")
+    if input_tokens:
+        LLM_TOKENS.inc(input_tokens, call=call, kind="input")
+    if output_tokens:
+        LLM_TOKENS.inc(output_tokens, call=call, kind="output")
+
+
+@contextmanager
+def time_llm_call(call: str):
+    """Time an LLM call; set ["response"] on the yielded dict to also record token usage."""
+    outcome = {}
+    start = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        LLM_CALL_DURATION.observe(time.perf_counter() - start, call=call)
+        if outcome.get("response") is not None:
+            record_llm_usage(call, outcome["response"])
+
+
+def timed_llm_call(call: str, fn: Callable) -> Callable:
+    """Wrap fn so every upstream attempt that actually runs is timed and its tokens recorded.
+
+    Pass the result to ResilientCall.call, so calls skipped by an open circuit or an
+    exhausted budget are not recorded as near-zero latencies.
+    """
+    def run():
+        with time_llm_call(call) as outcome:
+            outcome["response"] = fn()
+        return outcome["response"]
+    return run
+
+
+def record_llm_fallback(call: str) -> None:
+    """Count an LLM call that was answered by the local fallback."""
+    LLM_FALLBACKS.inc(call=call)
+
+
+def _bench_requests(client, path, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        client.get(path)
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    # Time real requests through back_end.app with and without the metrics middleware.
+    # Needs the same environment as the server (GROQ_API_KEY); uses a temporary database.
+    import os
+    import tempfile
+    iterations = 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["FAMILY_PLANNER_DB_URL"] = f"sqlite:///{tmp}/metrics.db"
+        from fastapi.testclient import TestClient
+        import back_end
+        import db
+        for i in range(20):
+            db.save_activity({"name": f"Activity {i}", "time": "15:00", "days": ["Monday", "Thursday"],
+                              "location": "Field", "caregiver": "Alice", "repetition": "weekly",
+                              "driver_required": i % 2 == 0, "date": "2025-06-09"})
+        app = back_end.app
+        paths = ["/driver_schedule?role=Driver", "/metrics"]
+        with TestClient(app) as client:
+            for path in paths:
+                client.get(path)
+            with_metrics = {path: _bench_requests(client, path, iterations) for path in paths}
+            # Rebuild the middleware stack without the metrics middleware
+            original_middleware = list(app.user_middleware)
+            app.user_middleware = [m for m in original_middleware
+                                   if m.kwargs.get("dispatch") is not back_end.record_request_metrics]
+            app.middleware_stack = None
+            for path in paths:
+                client.get(path)
+            without_metrics = {path: _bench_requests(client, path, iterations) for path in paths}
+            app.user_middleware = original_middleware
+            app.middleware_stack = None
+        db.engine.dispose()
+
+    print(f"{'route':<30} {'with ms':>8} {'without ms':>11} {'overhead us':>12} {'overhead':>9}")
+    for path in paths:
+        overhead = with_metrics[path] - without_metrics[path]
+        print(f"{path:<30} {with_metrics[path] * 1e3:8.3f} {without_metrics[path] * 1e3:11.3f} "
+              f"{overhead * 1e6:12.1f} {overhead / without_metrics[path] * 100:8.1f}%")
+
+    start = time.perf_counter()
+    text = REGISTRY.render()
+    print(f"Render time: {(time.perf_counter() - start) * 1e3:.2f} ms ({len(text)} bytes)")
+
+if __name__ == "__main__":
+    main()
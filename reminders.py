@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import heapq
+import asyncio
+import itertools
+import tracemalloc
+from datetime import date, datetime, time as time_of_day, timedelta
+from typing import Dict, List, Optional
+
+from metrics import REGISTRY, Gauge
+from temporal import DAYS_OF_WEEK, parse_date, parse_time, weekday_numbers
+
+# How far ahead reminder occurrences are precomputed, and how long before an activity they fire
+REMINDER_HORIZON_DAYS = int(os.getenv("REMINDER_HORIZON_DAYS", "7"))
+REMINDER_LEAD_MINUTES = int(os.getenv("REMINDER_LEAD_MINUTES", "30"))
+# Per-subscriber buffer; the oldest event is dropped when a slow client falls behind
+SUBSCRIBER_QUEUE_SIZE = 100
+
+SUBSCRIBERS = REGISTRY.register(Gauge(
+    "family_reminder_subscribers", "Connected reminder stream subscribers by role",
+    ("role",)
+))
+
+
+def visible_to(role: str, item: Dict) -> bool:
+    """Parents see every activity, drivers only driver-required ones, cooks none."""
+    if role == "Parent":
+        return True
+    if role == "Driver":
+        return bool(item.get("driver_required", False))
+    return False
+
+
+def expand_occurrences(activity: Dict, start: datetime, end: datetime) -> List[datetime]:
+    """Datetimes in [start, end) at which an activity takes place.
+
+    Weekly activities recur on each listed day, monthly ones on the day of month of
+    their date, and one-time activities happen once on their date.
+    """
+    try:
+        # Activities loaded from the database carry their parsed time and date
+        minutes = activity.get("time_minutes")
+        if minutes is None:
+            minutes = parse_time(activity["time"])
+        at = time_of_day(minutes // 60, minutes % 60)
+        ordinal = activity.get("date_ordinal")
+        if ordinal is None and activity.get("date"):
+            ordinal = parse_date(activity["date"])
+        first_date = date.fromordinal(ordinal) if ordinal is not None else start.date()
+    except (KeyError, ValueError):
+        # Free-form times or dates cannot be scheduled
+        return []
+    repetition = activity.get("repetition", "").lower()
+
+    occurrences = []
+    if repetition == "one-time":
+        occurrence = datetime.combine(first_date, at)
+        if start <= occurrence < end:
+            occurrences.append(occurrence)
+        return occurrences
+
+    weekdays = weekday_numbers(activity.get("days", []))
+    # Recurring activities start on their date, weekly ones included
+    day = max(start.date(), first_date)
+    while day <= end.date():
+        if repetition == "weekly" and day.weekday() in weekdays:
+            occurrences.append(datetime.combine(day, at))
+        elif repetition == "monthly" and day.day == first_date.day:
+            occurrences.append(datetime.combine(day, at))
+        day += timedelta(days=1)
+    return [o for o in occurrences if start <= o < end]
+
+
+class ReminderScheduler:
+    """Time-ordered queue of upcoming reminders, pushed to subscribed clients per role."""
+
+    def __init__(self, horizon_days: int = REMINDER_HORIZON_DAYS, lead_minutes: int = REMINDER_LEAD_MINUTES):
+        self.horizon = timedelta(days=horizon_days)
+        self.lead = timedelta(minutes=lead_minutes)
+        self.heap: List = []
+        self.activities: List[Dict] = []
+        self.horizon_end: Optional[datetime] = None
+        self.subscribers: Dict[str, set] = {}
+        # (activity name, occurrence) -> occurrence timestamp, so rebuilds do not resend reminders
+        self.delivered: Dict = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # Queue maintenance
+
+    def _reminders_for(self, activity: Dict, now: datetime):
+        """Heap entries for an activity's occurrences inside the current horizon."""
+        entries = []
+        for occurrence in expand_occurrences(activity, now, self.horizon_end):
+            key = (activity["name"], occurrence.isoformat())
+            if key in self.delivered:
+                continue
+            day = DAYS_OF_WEEK[occurrence.weekday()]
+            reminder = {
+                "name": activity["name"],
+                "date": occurrence.strftime("%Y-%m-%d"),
+                "day": day,
+                "time": activity["time"],
+                "location": activity["location"],
+                "caregiver": activity["caregiver"],
+                "driver_required": activity.get("driver_required", False),
+                "message": f"Reminder: {activity['name']} on {day}, {occurrence.strftime('%Y-%m-%d')} "
+                           f"at {activity['time']} at {activity['location']} (Caregiver: {activity['caregiver']})",
+            }
+            due = max(occurrence - self.lead, now)
+            entries.append((due.timestamp(), next(self._sequence), key, reminder))
+        return entries
+
+    def rebuild(self, activities: List[Dict], now: Optional[datetime] = None):
+        """Recompute upcoming reminders from the full activity list."""
+        now = now or datetime.now()
+        self.activities = list(activities)
+        self.horizon_end = now + self.horizon
+        # Forget delivered reminders whose activity has started
+        self.delivered = {key: ts for key, ts in self.delivered.items() if ts > now.timestamp()}
+        heap = []
+        for activity in self.activities:
+            heap.extend(self._reminders_for(activity, now))
+        heapq.heapify(heap)
+        self.heap = heap
+        self._wake()
+
+    def add_activity(self, activity: Dict, now: Optional[datetime] = None):
+        """Queue the reminders of a newly added activity."""
+        now = now or datetime.now()
+        if self.horizon_end is None:
+            self.horizon_end = now + self.horizon
+        self.activities.append(activity)
+        for entry in self._reminders_for(activity, now):
+            heapq.heappush(self.heap, entry)
+        self._wake()
+
+    def remove_activity(self, name: str):
+        """Drop the pending reminders of a deleted activity."""
+        self.activities = [a for a in self.activities if a["name"] != name]
+        self.heap = [entry for entry in self.heap if entry[3]["name"] != name]
+        heapq.heapify(self.heap)
+        self._wake()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[Dict]:
+        """Remove and return every reminder that is due."""
+        now_ts = (now or datetime.now()).timestamp()
+        due = []
+        while self.heap and self.heap[0][0] <= now_ts:
+            _, _, key, reminder = heapq.heappop(self.heap)
+            self.delivered[key] = datetime.fromisoformat(key[1]).timestamp()
+            due.append(reminder)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        return self.heap[0][0] if self.heap else None
+
+    # Subscribers
+
+    def subscribe(self, role: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.setdefault(role, set()).add(queue)
+        SUBSCRIBERS.set(len(self.subscribers[role]), role=role)
+        return queue
+
+    def unsubscribe(self, role: str, queue: asyncio.Queue):
+        self.subscribers.get(role, set()).discard(queue)
+        SUBSCRIBERS.set(len(self.subscribers.get(role, ())), role=role)
+
+    def publish(self, event: Dict, item: Optional[Dict] = None):
+        """Send an event to every subscriber whose role may see the item (or all roles if no item)."""
+        for role, queues in self.subscribers.items():
+            if item is not None and not visible_to(role, item):
+                continue
+            for queue in queues:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    def publish_schedule(self, schedule: List[Dict]):
+        """Push the new schedule to each role, filtered to what that role may see."""
+        for role, queues in self.subscribers.items():
+            event = {"type": "schedule", "schedule": [entry for entry in schedule if visible_to(role, entry)]}
+            for queue in queues:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    # Delivery loop
+
+    async def run(self):
+        """Sleep until the next reminder is due (or the queue changes) and push due reminders."""
+        self._wakeup = asyncio.Event()
+        while True:
+            now = datetime.now()
+            if self.horizon_end is not None and now + self.horizon - self.horizon_end >= timedelta(days=1):
+                # Roll the precomputed window forward once a day
+                self.rebuild(self.activities, now)
+            for reminder in self.pop_due(now):
+                self.publish({"type": "reminder", "reminder": reminder}, item=reminder)
+            next_due = self.next_due()
+            timeout = 3600.0 if next_due is None else max(next_due - time.time(), 0)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(timeout, 3600.0))
+            except asyncio.TimeoutError:
+                pass
+
+
+def format_sse(event: Dict) -> str:
+    """Encode an event as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+scheduler = ReminderScheduler()
+
+
+def main():
+    # Measure how many concurrent subscribers one worker can hold: memory per
+    # subscriber (queue plus waiting consumer task) and time to fan out one event
+    async def measure(count: int):
+        bench = ReminderScheduler()
+        received = 0
+        done = asyncio.Event()
+
+        async def consumer(queue):
+            nonlocal received
+            await queue.get()
+            received += 1
+            if received == count:
+                done.set()
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tasks = [asyncio.create_task(consumer(bench.subscribe("Driver"))) for _ in range(count)]
+        await asyncio.sleep(0)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        per_subscriber = sum(s.size_diff for s in after.compare_to(before, "filename")) / count
+
+        start = time.perf_counter()
+        bench.publish({"type": "reminder", "reminder": {"name": "bench", "driver_required": True}},
+                      item={"driver_required": True})
+        await done.wait()
+        fan_out = time.perf_counter() - start
+        await asyncio.gather(*tasks)
+        print(f"{count:>7} subscribers: {per_subscriber / 1024:.2f} KiB each, "
+              f"fan-out of one event {fan_out * 1000:.1f} ms")
+
+    for count in (1_000, 10_000, 50_000):
+        asyncio.run(measure(count))
+
+    activities = [{
+        "name": f"Activity {i}", "time": f"{8 + i % 10:02d}:{i % 60:02d}", "days": ["Monday", "Thursday"],
+        "location": "School", "caregiver": "Alice", "repetition": "weekly",
+        "driver_required": i % 2 == 0, "date": "2025-06-09",
+    } for i in range(10_000)]
+    start = time.perf_counter()
+    ReminderScheduler().rebuild(activities)
+    print(f"Rebuilding reminders for {len(activities)} activities: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
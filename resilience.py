@@ -0,0 +1,260 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from metrics import REGISTRY, Counter, Gauge
+
+# Total time a request may spend waiting on upstream LLM calls
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "20"))
+# Upper bound for a single LLM call, further capped by the remaining request budget
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "15"))
+# Send a second attempt when the first is slower than this percentile of recent calls; 0 disables
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# Consecutive failures that open the circuit, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+HEDGED_CALLS = REGISTRY.register(Counter(
+    "family_llm_hedged_total", "LLM calls that sent a hedged second attempt",
+    ("call",)
+))
+FAILED_CALLS = REGISTRY.register(Counter(
+    "family_llm_failures_total", "LLM calls that failed, by reason",
+    ("call", "reason")
+))
+CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "family_llm_circuit_open", "1 while the circuit breaker for an upstream is open",
+    ("upstream",)
+))
+
+_deadline = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when an upstream call is skipped or abandoned; callers use their local fallback."""
+
+
+@contextmanager
+def request_budget(seconds: float = REQUEST_BUDGET_SECONDS):
+    """Set the latency budget for upstream calls made in this context."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left in the current request budget, or None outside a request."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open trial after a cool-down."""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> Optional[str]:
+        """Admit a call upstream: "closed", or "trial" for the one call let through while
+        half-open; None when the call must not go upstream. The trial's owner ends it
+        with record_success, record_failure or release_trial."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "closed"
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return "trial"
+            return None
+
+    def release_trial(self):
+        """Give up a trial without an outcome so the next request may try upstream."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+        CIRCUIT_OPEN.set(0, upstream=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                CIRCUIT_OPEN.set(1, upstream=self.name)
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile, or None until enough samples have been seen."""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+# Worker threads for upstream calls; timed-out attempts keep running here until the
+# HTTP client gives up, so the pool is sized for a few abandoned calls per request
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
+
+class ResilientCall:
+    """Run an upstream call within the request budget, with optional hedging and a circuit breaker."""
+
+    def __init__(self, name: str, breaker: CircuitBreaker, timeout: float = LLM_TIMEOUT_SECONDS,
+                 hedge_percentile: float = LLM_HEDGE_PERCENTILE, executor: ThreadPoolExecutor = _executor):
+        self.name = name
+        self.breaker = breaker
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.latencies = LatencyTracker()
+        self.executor = executor
+
+    def _submit(self, fn: Callable):
+        # Copy the context so spans and metrics recorded inside fn reach the request's trace
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, fn)
+
+    def _fail(self, reason: str, error: Optional[BaseException] = None):
+        FAILED_CALLS.inc(call=self.name, reason=reason)
+        self.breaker.record_failure()
+        raise UpstreamUnavailable(f"{self.name}: {reason}") from error
+
+    def call(self, fn: Callable):
+        """Return fn()'s result, or raise UpstreamUnavailable so the caller falls back locally."""
+        admitted = self.breaker.allow()
+        if admitted is None:
+            FAILED_CALLS.inc(call=self.name, reason="circuit_open")
+            raise UpstreamUnavailable(f"{self.name}: circuit open")
+
+        timeout = self.timeout
+        remaining = remaining_budget()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        if timeout <= 0:
+            # Not an upstream failure, so leave the breaker alone
+            FAILED_CALLS.inc(call=self.name, reason="budget_exhausted")
+            if admitted == "trial":
+                self.breaker.release_trial()
+            raise UpstreamUnavailable(f"{self.name}: request budget exhausted")
+
+        start = time.monotonic()
+        deadline = start + timeout
+        hedge_after = self.latencies.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        hedge_at = start + hedge_after if hedge_after is not None else None
+        pending = {self._submit(fn)}
+        hedged = False
+        last_error = None
+
+        while True:
+            wait_until = deadline if hedged or hedge_at is None else min(deadline, hedge_at)
+            done, pending = wait(pending, timeout=max(wait_until - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self.latencies.record(time.monotonic() - start)
+                self.breaker.record_success()
+                return result
+            now = time.monotonic()
+            if now >= deadline:
+                self._fail("timeout")
+            if not hedged and hedge_at is not None and (now >= hedge_at or not pending):
+                # The first attempt is slower than usual, or failed fast: race a second one
+                hedged = True
+                HEDGED_CALLS.inc(call=self.name)
+                pending.add(self._submit(fn))
+                continue
+            if not pending:
+                self._fail("error", last_error)
+
+
+# Both LLM call sites go to Groq, so they share one breaker
+GROQ_BREAKER = CircuitBreaker("groq")
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def main():
+    # Fault-injecting stub: report p50/p99 end-to-end latency (including the local
+    # fallback) and the fallback rate under each failure mode
+    def stub(mode):
+        def call():
+            if mode == "slow_tail" and random.random() < 0.05:
+                time.sleep(1.0)
+            elif mode == "hang" and random.random() < 0.2:
+                time.sleep(1.0)
+            elif mode == "errors" and random.random() < 0.3:
+                time.sleep(0.005)
+                raise RuntimeError("injected error")
+            elif mode == "outage":
+                raise RuntimeError("upstream down")
+            time.sleep(random.lognormvariate(-3.5, 0.3))  # ~30 ms
+            return "ok"
+        return call
+
+    random.seed(1)
+    print(f"{'mode':<10} {'p50 ms':>8} {'p99 ms':>8} {'fallback':>9} {'hedged':>7}")
+    for mode in ["healthy", "slow_tail", "hang", "errors", "outage"]:
+        breaker = CircuitBreaker(f"stub-{mode}", failure_threshold=5, reset_seconds=0.5)
+        resilient = ResilientCall(f"stub-{mode}", breaker, timeout=0.25, hedge_percentile=95)
+        latencies, fallbacks = [], 0
+        for _ in range(300):
+            start = time.monotonic()
+            with request_budget(0.3):
+                try:
+                    resilient.call(stub(mode))
+                except UpstreamUnavailable:
+                    fallbacks += 1
+            latencies.append((time.monotonic() - start) * 1000)
+        hedged = HEDGED_CALLS._values.get((f"stub-{mode}",), 0)
+        print(f"{mode:<10} {_percentile(latencies, 50):8.1f} {_percentile(latencies, 99):8.1f} "
+              f"{fallbacks / len(latencies):9.1%} {hedged:7}")
+
+
+if __name__ == "__main__":
+    main()
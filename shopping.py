@@ -1,78 +1,170 @@
 import os
+import json
 from dotenv import load_dotenv
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from langchain_groq import ChatGroq
 from langchain.prompts import ChatPromptTemplate
+from metrics import timed_llm_call, record_llm_fallback
+from tracing import span
+from resilience import GROQ_BREAKER, LLM_TIMEOUT_SECONDS, ResilientCall, UpstreamUnavailable
+from ingredients import aggregate_ingredients, format_item, meal_plan_ingredients, normalize_name
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-# Initialize the LLM
+# Initialize the LLM; without an API key shopping lists are left uncategorized
 llm = ChatGroq(
     groq_api_key=GROQ_API_KEY,
     model_name="mixtral-8x7b-32768",
-    temperature=0.5
-)
+    temperature=0.5,
+    max_retries=0,
+    timeout=LLM_TIMEOUT_SECONDS
+) if GROQ_API_KEY else None
+
+# Budgeted, hedged calls sharing the Groq circuit breaker with meal_plane.py
+categorize_calls = {
+    name: ResilientCall(name, GROQ_BREAKER)
+    for name in ["shopping_list_generator", "shopping_list_update"]
+}
+
+# Create prompt for LLM to categorize ingredients. Literal braces in the example
+# are doubled so the template does not treat them as input variables.
+prompt_template = ChatPromptTemplate.from_template("""
+    You are a meal planning assistant. Given a list of ingredients, group them into
+    grocery store sections. Use the ingredient names exactly as given.
+
+    Ingredients: {ingredients}
+
+    Example output:
+    ```json
+    {{
+        "Produce": ["banana", "spinach"],
+        "Dairy": ["ricotta cheese", "mozzarella cheese"],
+        "Pantry": ["olive oil", "spaghetti"],
+        "Bakery": ["whole wheat bread", "baguette"],
+        "Other": ["hummus", "Italian seasoning"]
+    }}
+    ```
+
+    Output only the JSON object.
+""")
+
+def categorize_ingredients(names: List[str], call_name: str = "shopping_list_generator") -> Dict[str, List[str]]:
+    """Ask the LLM to sort canonical ingredient names into store sections.
+
+    Names the LLM drops or renames are put under "Other"; raises if the call fails,
+    times out or the circuit breaker is open.
+    """
+    if llm is None:
+        raise UpstreamUnavailable("GROQ_API_KEY is not set")
+    prompt = prompt_template.format_messages(ingredients=", ".join(names))
+    with span(f"llm.{call_name}"):
+        response = categorize_calls[call_name].call(timed_llm_call(call_name, lambda: llm.invoke(prompt)))
+    # Parse the JSON response, tolerating a ```json fenced block
+    content = response.content
+    if isinstance(content, str):
+        content = json.loads(content.strip().removeprefix("```json").removeprefix("```").removesuffix("```"))
+
+    known = set(names)
+    sections: Dict[str, List[str]] = {}
+    placed = set()
+    for section, items in content.items():
+        for item in items:
+            name = normalize_name(item) if item not in known else item
+            if name in known and name not in placed:
+                sections.setdefault(section, []).append(name)
+                placed.add(name)
+    missing = [name for name in names if name not in placed]
+    if missing:
+        sections.setdefault("Other", []).extend(missing)
+    return sections
 
 def shopping_list_generator(meal_plan: Dict[str, List[List[str]]]) -> Dict[str, List[str]]:
     """
     Generate a shopping list from a weekly meal plan by calling the LLM.
-    
+
+    Ingredients are normalized and their quantities totalled for the week locally,
+    so the LLM only categorizes each canonical ingredient once.
+
     Args:
         meal_plan: Dictionary with day keys and lists of [dish, ingredients] pairs.
-    
+
     Returns:
         Dictionary with store sections as keys and lists of ingredients as values.
     """
-    # Extract all ingredients from the meal plan
-    all_ingredients = []
-    for day, meals in meal_plan.items():
-        for meal in meals:
-            if len(meal) > 1:  # Ensure ingredients exist
-                ingredients = meal[1].split(", ")
-                all_ingredients.extend(ingredients)
-
-    # Remove duplicates while preserving order
-    unique_ingredients = list(dict.fromkeys(all_ingredients))
-
-    # Create prompt for LLM to categorize ingredients
-    prompt_template = ChatPromptTemplate.from_template("""
-        You are a meal planning assistant. Given a list of ingredients,only ingredients not the whole food itself
-        ingredient names exactly as given.
-
-        Ingredients: {ingredients}
-
-        Example output:
-        ```json
-        {
-            "Produce": ["banana", "spinach"],
-            "Dairy": ["ricotta cheese", "mozzarella cheese"],
-            "Pantry": ["olive oil", "spaghetti"],
-            "Bakery": ["whole wheat bread", "baguette"],
-            "Other": ["hummus", "Italian seasoning"]
-        }
-        ```
-
-        Output only the JSON object.
-    """)
-
-    # Call the LLM with the ingredients
+    # Normalize and aggregate all ingredients in the meal plan
+    aggregated = aggregate_ingredients(meal_plan_ingredients(meal_plan))
+    names = list(aggregated)
+
     try:
-        prompt = prompt_template.format_messages(ingredients=", ".join(unique_ingredients))
-        response = llm.invoke(prompt)
-        # Parse the JSON response
-        shopping_list = response.content
-        if isinstance(shopping_list, str):
-            import json
-            shopping_list = json.loads(shopping_list)
-        return shopping_list
+        sections = categorize_ingredients(names)
     except Exception as e:
         # Fallback: Return uncategorized list if LLM fails
-        return {
+        record_llm_fallback("shopping_list_generator")
+        sections = {"Ingredients": names}
+
+    return {
+        section: [format_item(name, aggregated[name]) for name in section_names]
+        for section, section_names in sections.items()
+    }
+
+def _item_name(item: str) -> str:
+    """Canonical ingredient name of a rendered shopping list item such as "egg (6)"."""
+    if item.endswith(")") and " (" in item:
+        item = item.rsplit(" (", 1)[0]
+    return normalize_name(item)
+
+def update_shopping_list(
+    shopping_list: Dict[str, List[str]],
+    old_meal_plan: Dict[str, List[List[str]]],
+    new_meal_plan: Dict[str, List[List[str]]],
+) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    Update a shopping list in place of rebuilding it after some meals changed.
+
+    Quantities are re-totalled locally; only ingredients that are new to the week are
+    sent to the LLM for categorization, and items no longer needed are removed.
+
+    Returns:
+        The updated shopping list and the names that were added, removed and updated.
+    """
+    old = aggregate_ingredients(meal_plan_ingredients(old_meal_plan))
+    new = aggregate_ingredients(meal_plan_ingredients(new_meal_plan))
+
+    updated = {section: list(items) for section, items in shopping_list.items()}
+    location = {}
+    for section, items in updated.items():
+        for i, item in enumerate(items):
+            location.setdefault(_item_name(item), (section, i))
+
+    removed = [name for name in old if name not in new]
+    changed = [
+        name for name in new
+        if name in location and (name not in old or new[name]["quantities"] != old[name]["quantities"])
+    ]
+    added = [name for name in new if name not in location]
+
+    for name in changed:
+        section, i = location[name]
+        updated[section][i] = format_item(name, new[name])
+    removed_items = {location[name] for name in removed if name in location}
+    updated = {
+        section: [item for i, item in enumerate(items) if (section, i) not in removed_items]
+        for section, items in updated.items()
+    }
+
+    if added:
+        try:
+            sections = categorize_ingredients(added, call_name="shopping_list_update")
+        except Exception as e:
+            record_llm_fallback("shopping_list_update")
+            sections = {"Other": added}
+        for section, names in sections.items():
+            updated.setdefault(section, []).extend(format_item(name, new[name]) for name in names)
 
-            "Ingredients": unique_ingredients
-        }
+    updated = {section: items for section, items in updated.items() if items}
+    return updated, {"added": added, "removed": removed, "updated": changed}
 
 if __name__ == "__main__":
     # Example meal plan for testing
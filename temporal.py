@@ -0,0 +1,68 @@
+import re
+from datetime import date
+from typing import Iterable, List, Set
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+REPETITIONS = ["weekly", "monthly", "one-time"]
+
+_TIME = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*$")
+_DAY_LOOKUP = {day.lower(): index for index, day in enumerate(DAYS_OF_WEEK)}
+_DAY_LOOKUP.update({day[:3].lower(): index for index, day in enumerate(DAYS_OF_WEEK)})
+
+
+def parse_time(value: str) -> int:
+    """Minutes since midnight for an "H:MM" or "HH:MM" time of day."""
+    match = _TIME.match(value or "")
+    if not match:
+        raise ValueError(f"Invalid time '{value}', use HH:MM")
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"Invalid time '{value}', use HH:MM")
+    return hours * 60 + minutes
+
+
+def format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_date(value: str) -> int:
+    """Proleptic Gregorian ordinal of a YYYY-MM-DD date."""
+    try:
+        return date.fromisoformat((value or "").strip()).toordinal()
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', use YYYY-MM-DD")
+
+
+def format_date(ordinal: int) -> str:
+    return date.fromordinal(ordinal).isoformat()
+
+
+def parse_weekday(value: str) -> int:
+    """Weekday number (Monday = 0) of a day name such as "Monday", "monday" or "Mon"."""
+    try:
+        return _DAY_LOOKUP[(value or "").strip().lower()]
+    except KeyError:
+        raise ValueError(f"Invalid day '{value}', use {DAYS_OF_WEEK}")
+
+
+def weekday_numbers(values: Iterable[str]) -> Set[int]:
+    """Weekday numbers of the day names that parse; legacy values may hold others."""
+    weekdays = set()
+    for value in values:
+        try:
+            weekdays.add(parse_weekday(value))
+        except ValueError:
+            continue
+    return weekdays
+
+
+def normalize_days(values: List[str]) -> List[str]:
+    """Canonical day names in week order, without duplicates."""
+    return [DAYS_OF_WEEK[index] for index in sorted({parse_weekday(value) for value in values})]
+
+
+def normalize_repetition(value: str) -> str:
+    repetition = (value or "").strip().lower()
+    if repetition not in REPETITIONS:
+        raise ValueError(f"Invalid repetition '{value}', use weekly/monthly/one-time")
+    return repetition
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the repository root rather than in a package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# db.py migrates its database on import: point it at a throwaway file, and keep the
+# planner and shopping list offline
+os.environ["FAMILY_PLANNER_DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+os.environ["MEAL_PLANNER"] = "engine"
+os.environ["GROQ_API_KEY"] = ""
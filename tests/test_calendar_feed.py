@@ -0,0 +1,9 @@
+from calendar_feed import ics_stream
+
+
+def test_weekly_rule_accepts_any_day_name_form():
+    activity = {"id": 1, "name": "Chess", "time": "16:00", "days": ["tue", "Thu"], "location": "Club",
+                "caregiver": "Bob", "repetition": "weekly", "date": "2025-06-09"}
+    lines = [line for chunk in ics_stream([activity], "Test") for line in chunk.splitlines()]
+    assert "DTSTART:20250610T160000" in lines
+    assert "RRULE:FREQ=WEEKLY;BYDAY=TU,TH" in lines
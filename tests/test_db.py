@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+import db
+from conftest import ROOT
+
+# Schema and data of a database created by the first release of db.py
+BASELINE_SCHEMA = """
+CREATE TABLE family_members (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, timestamp DATETIME);
+CREATE TABLE activities (
+    id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, time VARCHAR NOT NULL, days VARCHAR NOT NULL,
+    location VARCHAR NOT NULL, caregiver VARCHAR NOT NULL, repetition VARCHAR NOT NULL,
+    driver_required BOOLEAN, date VARCHAR NOT NULL, timestamp DATETIME
+);
+CREATE TABLE meal_plans (id INTEGER PRIMARY KEY, data TEXT NOT NULL, timestamp DATETIME);
+CREATE TABLE shopping_lists (id INTEGER PRIMARY KEY, data TEXT NOT NULL, timestamp DATETIME);
+CREATE TABLE schedules (id INTEGER PRIMARY KEY, data TEXT NOT NULL, timestamp DATETIME);
+INSERT INTO family_members (name, timestamp) VALUES ('Alice', '2024-05-01 08:00:00');
+INSERT INTO activities (name, time, days, location, caregiver, repetition, driver_required, date, timestamp)
+VALUES ('Soccer', '16:30', '["Tuesday", "Thursday"]', 'Field', 'Alice', 'Weekly', 1, '2024-05-07', '2024-05-01 08:00:00'),
+       ('Chess', '9:00', '["thu", "tue"]', 'Club', 'Bob', 'weekly', 0, '2024-05-07', '2024-05-01 08:00:00'),
+       ('Piano', 'after school', 'someday', 'Home', 'Bob', 'weekly', 0, 'soon', '2024-05-01 08:00:00');
+INSERT INTO meal_plans (data, timestamp) VALUES ('{"monday": [["Poha", "onion, peanuts"]]}', '2024-05-01 08:00:00');
+"""
+
+
+def _run(db_url, code):
+    """Run code in a fresh interpreter whose db module uses db_url; returns its stdout."""
+    env = dict(os.environ, FAMILY_PLANNER_DB_URL=db_url)
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_baseline_database_is_migrated_in_place(tmp_path):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(BASELINE_SCHEMA)
+    db_url = f"sqlite:///{path}"
+
+    # Workers starting together must not race each other through the migrations
+    code = "import db, json; print(json.dumps(db.load_latest_data(), default=str))"
+    workers = [subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True,
+                                env=dict(os.environ, FAMILY_PLANNER_DB_URL=db_url)) for _ in range(3)]
+    outputs = [worker.communicate(timeout=120) for worker in workers]
+    assert all(worker.returncode == 0 for worker in workers), [err for _, err in outputs]
+    data = json.loads(outputs[0][0])
+
+    assert data["family_members"] == ["Alice"]
+    assert data["meal_plan"] == {"monday": [["Poha", "onion, peanuts"]]}
+    activities = {activity["name"]: activity for activity in data["activities"]}
+    assert activities["Soccer"]["time"] == "16:30"
+    assert activities["Soccer"]["days"] == ["Tuesday", "Thursday"]
+    # Day names are stored in their canonical form, in week order
+    assert activities["Chess"]["time"] == "09:00"
+    assert activities["Chess"]["days"] == ["Tuesday", "Thursday"]
+    # A row that cannot be parsed is kept rather than failing the migration
+    assert "Piano" in activities
+
+    with sqlite3.connect(path) as connection:
+        weekdays = connection.execute(
+            "SELECT weekday FROM activity_days JOIN activities ON activities.id = activity_id "
+            "WHERE name = 'Soccer' ORDER BY weekday").fetchall()
+        applied = connection.execute("SELECT COUNT(*) FROM schema_migrations").fetchone()[0]
+    assert weekdays == [(1,), (3,)]
+    assert applied == len(db.MIGRATIONS)
+
+    # The schedule still lists the unparseable activity, after the week
+    schedule = json.loads(_run(db_url, "import db, json; print(json.dumps(db.load_schedule()))"))
+    assert [(entry["day"], entry["activity"]) for entry in schedule[:4]] == [
+        ("Tuesday", "Chess"), ("Tuesday", "Soccer"), ("Thursday", "Chess"), ("Thursday", "Soccer")]
+    assert schedule[-1]["activity"] == "Piano"
+
+
+@pytest.fixture
+def client():
+    import back_end
+    with TestClient(back_end.app) as client:
+        yield client
+
+
+def _activity(name):
+    return {"name": name, "time": "15:00", "days": ["Monday"], "location": "Field", "caregiver": "Alice",
+            "repetition": "weekly", "driver_required": True, "date": "2025-06-09"}
+
+
+def test_delete_invalidates_if_modified_since(client):
+    assert client.post("/Child_activity?role=Parent", json=_activity("Feed Swim")).status_code == 200
+    # Last-Modified is only sent once its second is over
+    time.sleep(1.1)
+    feed = client.get("/calendar.ics?role=Parent")
+    last_modified = feed.headers["last-modified"]
+    assert "Feed Swim" in feed.text
+    assert client.get("/calendar.ics?role=Parent",
+                      headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    assert client.delete("/activity/Feed Swim?role=Parent").status_code == 200
+    feed = client.get("/calendar.ics?role=Parent", headers={"If-Modified-Since": last_modified})
+    assert feed.status_code == 200
+    assert "Feed Swim" not in feed.text
+
+
+def test_write_from_another_process_bumps_versions():
+    names = lambda: {activity["name"] for activity in db.load_latest_data()["activities"]}
+    assert "Other Worker" not in names()
+    before = db.read_versions()
+
+    _run(db.DATABASE_URL, "import db; db.save_activity(%r)" % (_activity("Other Worker"),))
+    assert db.read_versions()["activities"] > before["activities"]
+    assert "Other Worker" in names()
+
+    _run(db.DATABASE_URL, "import db; db.delete_activity('Other Worker')")
+    assert "Other Worker" not in names()
@@ -0,0 +1,22 @@
+import pytest
+
+from ingredients import aggregate_ingredients, format_item, parse_ingredient
+
+
+@pytest.mark.parametrize("text, name, quantity, unit", [
+    ("1 1/2 cups chopped tomatoes", "tomato", 360.0, "ml"),
+    ("1 (14 oz) can chickpeas", "chickpea", 1.0, "can"),
+    ("1 can (400 g) tomatoes", "tomato", 1.0, "can"),
+    ("1 garlic clove", "garlic", 1.0, "clove"),
+    ("2 cloves garlic", "garlic", 2.0, "clove"),
+    ("3 large eggs", "egg", 3.0, "count"),
+    ("garlic", "garlic", None, None),
+])
+def test_parse_ingredient(text, name, quantity, unit):
+    parsed = parse_ingredient(text)
+    assert (parsed["name"], parsed["quantity"], parsed["unit"]) == (name, quantity, unit)
+
+
+def test_unit_before_and_after_name_aggregate_together():
+    aggregated = aggregate_ingredients(["1 garlic clove", "2 cloves garlic", "3 garlic cloves, minced"])
+    assert format_item("garlic", aggregated["garlic"]) == "garlic (6 clove)"
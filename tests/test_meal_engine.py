@@ -0,0 +1,41 @@
+import pytest
+
+import meal_engine
+
+
+def _week_ingredients(meal_plan):
+    """Normalized ingredients of every recipe picked for the week."""
+    catalog = {recipe["name"]: recipe for recipe in meal_engine.load_catalog()}
+    return {
+        ingredient
+        for meals in meal_plan.values()
+        for meal in meals
+        for ingredient in catalog[meal[0]]["normalized_ingredients"]
+    }
+
+
+@pytest.mark.parametrize("query, excluded", [
+    ("no onions, garlic or nuts please", {"onion", "garlic", "nut"}),
+    ("dairy-free", {"dairy"}),
+    ("nut-free vegan week", {"nut"}),
+    ("allergic to peanuts and shellfish", {"peanut", "shellfish"}),
+    ("without any mushrooms, vegetarian", {"mushroom"}),
+    ("vegan gluten-free week", set()),
+])
+def test_parse_exclusions(query, excluded):
+    assert meal_engine.parse_constraints(query)["excluded"] == excluded
+
+
+@pytest.mark.parametrize("query, forbidden", [
+    ("no onions, garlic or nuts please", {"onion", "garlic", "peanut", "peanut butter", "walnut", "cashew"}),
+    ("dairy-free", {"milk", "cheese", "butter", "cream", "yogurt", "ghee", "paneer", "feta cheese"}),
+    ("allergic to peanuts", {"peanut", "peanut butter"}),
+])
+def test_plan_week_respects_exclusions(query, forbidden):
+    assert not _week_ingredients(meal_engine.plan_week(query)) & forbidden
+
+
+def test_dairy_free_keeps_plant_milks():
+    recipe = {"diets": [], "normalized_ingredients": ["almond milk", "banana", "peanut butter"]}
+    assert meal_engine._allowed(recipe, meal_engine.parse_constraints("dairy-free"))
+    assert not meal_engine._allowed(recipe, meal_engine.parse_constraints("nut-free"))
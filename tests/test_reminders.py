@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from reminders import expand_occurrences
+
+
+def _activity(**fields):
+    activity = {"name": "Swim", "time": "16:00", "days": ["Monday", "Thursday"], "repetition": "weekly",
+                "location": "Pool", "caregiver": "Alice"}
+    activity.update(fields)
+    return activity
+
+
+def test_weekly_occurrences_start_on_the_activity_date():
+    # 2025-06-09 is a Monday; the activity starts on Thursday 2025-06-12
+    occurrences = expand_occurrences(_activity(date="2025-06-12"), datetime(2025, 6, 9), datetime(2025, 6, 23))
+    assert occurrences == [datetime(2025, 6, 12, 16), datetime(2025, 6, 16, 16), datetime(2025, 6, 19, 16)]
+
+
+def test_monthly_occurrences_start_on_the_activity_date():
+    occurrences = expand_occurrences(_activity(repetition="monthly", date="2025-07-10"),
+                                     datetime(2025, 6, 1), datetime(2025, 9, 1))
+    assert occurrences == [datetime(2025, 7, 10, 16), datetime(2025, 8, 10, 16)]
+
+
+def test_weekly_occurrences_without_a_date_start_now():
+    occurrences = expand_occurrences(_activity(), datetime(2025, 6, 10), datetime(2025, 6, 17))
+    assert occurrences == [datetime(2025, 6, 12, 16), datetime(2025, 6, 16, 16)]
+
+
+def test_abbreviated_and_lowercase_day_names():
+    occurrences = expand_occurrences(_activity(days=["mon", "thursday"]), datetime(2025, 6, 9), datetime(2025, 6, 16))
+    assert occurrences == [datetime(2025, 6, 9, 16), datetime(2025, 6, 12, 16)]
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from metrics import LLM_CALL_DURATION, timed_llm_call
+from resilience import CircuitBreaker, ResilientCall, UpstreamUnavailable, request_budget
+
+
+def _observed(call):
+    series = LLM_CALL_DURATION._values.get((call,))
+    return series[2] if series else 0
+
+
+def _half_open_breaker(name):
+    breaker = CircuitBreaker(name, failure_threshold=1, reset_seconds=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_budget_exhausted_call_keeps_another_requests_trial():
+    breaker = _half_open_breaker("test-trial")
+    assert breaker.allow() == "trial"
+    # A second request is refused while the trial is in flight, even with no budget left
+    with request_budget(0):
+        with pytest.raises(UpstreamUnavailable, match="circuit open"):
+            ResilientCall("test-trial", breaker).call(lambda: "ok")
+    assert breaker.trial_in_flight
+    assert breaker.allow() is None
+
+
+def test_budget_exhausted_trial_is_released():
+    breaker = _half_open_breaker("test-release")
+    with request_budget(0):
+        with pytest.raises(UpstreamUnavailable, match="budget exhausted"):
+            ResilientCall("test-release", breaker).call(lambda: "ok")
+    assert not breaker.trial_in_flight
+    assert breaker.allow() == "trial"
+
+
+def test_skipped_calls_are_not_timed():
+    breaker = CircuitBreaker("test-timing", failure_threshold=1, reset_seconds=60)
+    resilient = ResilientCall("test-timing", breaker, hedge_percentile=0)
+    assert resilient.call(timed_llm_call("test-timing", lambda: "ok")) == "ok"
+    assert _observed("test-timing") == 1
+
+    breaker.record_failure()
+    with pytest.raises(UpstreamUnavailable, match="circuit open"):
+        resilient.call(timed_llm_call("test-timing", lambda: "ok"))
+    with request_budget(0):
+        with pytest.raises(UpstreamUnavailable):
+            resilient.call(timed_llm_call("test-timing", lambda: "ok"))
+    assert _observed("test-timing") == 1
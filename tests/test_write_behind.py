@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import db
+
+
+class FlakySession:
+    """Session stand-in whose commits fail while the test says so."""
+    fail = True
+    committed = []
+
+    def add_all(self, rows):
+        self.rows = rows
+
+    def commit(self):
+        if FlakySession.fail:
+            raise RuntimeError("database is locked")
+        FlakySession.committed.extend(self.rows)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    FlakySession.fail, FlakySession.committed = True, []
+    monkeypatch.setattr(db, "Session", FlakySession)
+    monkeypatch.setattr(db, "WRITE_BEHIND_RETRIES", 3)
+    # A long window keeps the background thread asleep; the test flushes by hand
+    return db.WriteBehindQueue(60_000)
+
+
+def _flush_failing(queue):
+    with pytest.raises(RuntimeError):
+        queue.flush()
+
+
+def test_failed_rows_are_retried_and_committed(queue):
+    row = SimpleNamespace(id=7)
+    future = queue.submit([row])
+    _flush_failing(queue)
+    assert row.id is None and not future.done()
+    FlakySession.fail = False
+    queue.flush()
+    assert future.result(timeout=0) is None
+    assert FlakySession.committed == [row]
+
+
+def test_attempts_are_counted_per_submit(queue):
+    old, new = SimpleNamespace(id=None), SimpleNamespace(id=None)
+    old_future = queue.submit([old])
+    _flush_failing(queue)
+    _flush_failing(queue)
+    # Merged into the third attempt, which is the last one for the older rows only
+    new_future = queue.submit([new])
+    _flush_failing(queue)
+    assert isinstance(old_future.exception(timeout=0), RuntimeError)
+    assert not new_future.done()
+    _flush_failing(queue)
+    FlakySession.fail = False
+    queue.flush()
+    assert new_future.result(timeout=0) is None
+    assert FlakySession.committed == [new]
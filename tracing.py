@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import uuid
+import inspect
+import random
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Fraction of requests traced without the debug header (0.0 - 1.0)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+# JSON lines file that finished traces are appended to; unset disables export
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+# Request header that forces tracing and returns a Server-Timing breakdown
+DEBUG_HEADER = "X-Debug-Trace"
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_export_lock = threading.Lock()
+
+
+class Trace:
+    """Timeline of spans recorded while serving a single request."""
+
+    def __init__(self, name: str, debug: bool = False):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.debug = debug
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.handler_end = None
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float, **attributes):
+        """Record a span from perf_counter() timestamps."""
+        span = {
+            "name": name,
+            "start_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+        }
+        if attributes:
+            span["attributes"] = attributes
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return round((end - self.start) * 1000, 3)
+
+    def to_dict(self) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms(),
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+
+    def server_timing(self) -> str:
+        """Aggregate spans by name into a Server-Timing header value."""
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans:
+            entry = totals.setdefault(span["name"], [0.0, 0])
+            entry[0] += span["duration_ms"]
+            entry[1] += 1
+        metrics = []
+        for name, (duration, count) in totals.items():
+            metric = f"{name};dur={duration:.3f}"
+            if count > 1:
+                metric += f';desc="{count} calls"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={self.duration_ms():.3f}")
+        return ", ".join(metrics)
+
+
+def should_trace(debug: bool = False) -> bool:
+    """Decide whether to trace a request: always with the debug header, otherwise sampled."""
+    return debug or (TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE)
+
+
+def start_trace(name: str, debug: bool = False):
+    """Start a trace for the current context; returns (trace, token) for end_trace."""
+    trace = Trace(name, debug=debug)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(trace: Trace, token) -> None:
+    """Finish the trace, reset the context and export it if an export path is set."""
+    trace.finish()
+    _current_trace.reset(token)
+    if TRACE_EXPORT_PATH:
+        export_trace(trace, TRACE_EXPORT_PATH)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def export_trace(trace: Trace, path: str) -> None:
+    """Append a trace as one JSON line to the given file."""
+    line = json.dumps(trace.to_dict())
+    with _export_lock:
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a span in the current trace; a no-op when the request is not traced."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter(), **attributes)
+
+
+def traced(name: str):
+    """Decorator recording a span around each call of a synchronous function."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_endpoint(func):
+    """Wrap an endpoint to record validation (request start to handler entry) and handler spans.
+
+    Plain def endpoints stay synchronous so FastAPI still runs them in its threadpool.
+    """
+    @contextmanager
+    def handler_span():
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        handler_start = time.perf_counter()
+        # Everything before the handler runs is routing, body parsing and Pydantic validation
+        trace.add_span("validation", trace.start, handler_start)
+        try:
+            yield
+        finally:
+            trace.handler_end = time.perf_counter()
+            trace.add_span("handler", handler_start, trace.handler_end)
+
+    if not inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        def sync_wrapper(*args, **kwargs):
+            with handler_span():
+                return func(*args, **kwargs)
+        return sync_wrapper
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with handler_span():
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def instrument_engine(engine):
+    """Record a span for every SQL statement executed on the engine."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_trace.get() is not None:
+            conn.info.setdefault("trace_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _current_trace.get()
+        starts = conn.info.get("trace_query_start")
+        if trace is None or not starts:
+            return
+        start = starts.pop()
+        trace.add_span("db.query", start, time.perf_counter(), statement=statement[:200])
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        # A failed statement never reaches after_cursor_execute; pop its start time so
+        # it does not stay on the pooled connection and mistime later statements
+        conn = context.connection
+        starts = conn.info.get("trace_query_start") if conn is not None else None
+        if not starts:
+            return
+        start = starts.pop()
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span("db.query", start, time.perf_counter(),
+                           statement=(context.statement or "")[:200], error=True)
+
+
+def instrument_sessions(session_factory):
+    """Record a span for each session transaction, from BEGIN to commit, rollback or close."""
+    from sqlalchemy import event
+
+    @event.listens_for(session_factory, "after_begin")
+    def _after_begin(session, transaction, connection):
+        if _current_trace.get() is not None:
+            session.info["trace_session_start"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_transaction_end")
+    def _after_transaction_end(session, transaction):
+        trace = _current_trace.get()
+        if transaction.parent is not None:
+            return
+        start = session.info.pop("trace_session_start", None)
+        if trace is not None and start is not None:
+            trace.add_span("db.session", start, time.perf_counter())